@@ -8,7 +8,7 @@ import numpy as np
 from stacking._version import __version__
 
 
-@njit
+@njit(cache=True)
 def compute_norm_factors(flux,
                          ivar,
                          wavelength,
@@ -26,6 +26,9 @@ defaults = {}
 
 VALID_STEP_TYPES = ["lin", "log"]
 
+# number of spectra rebinned together by Rebin.rebin_spectra
+REBIN_BATCH_SIZE = 1000
+
 
 class Rebin:
     """Class to rebin spectra
@@ -34,6 +37,7 @@ class Rebin:
     -------
     __init__
     __call__
+    rebin_spectra
 
     Attributes
     ----------
@@ -120,6 +124,47 @@ class Rebin:
 
         return spectrum
 
+    def rebin_spectra(self, spectra):
+        """Rebin a list of spectra. The spectra are rebinned in batches, each
+        of them with a single call to the rebinning function
+
+        Arguments
+        ---------
+        spectra: list of Spectrum
+        The spectra to be rebinned. They are rebinned in place
+        """
+        for start in range(0, len(spectra), REBIN_BATCH_SIZE):
+            batch = spectra[start:start + REBIN_BATCH_SIZE]
+            sizes = np.array([spectrum.flux.size for spectrum in batch])
+
+            wavelength = np.concatenate([
+                spectrum.wavelength for spectrum in batch
+            ]) / np.repeat([1 + spectrum.redshift for spectrum in batch], sizes)
+            if self.step_type == "log":
+                # see __call__
+                wavelength = np.log10(wavelength)
+            # this should never enter unless new step types are not properly added
+            elif self.step_type != "lin":  # pragma: no cover
+                raise RebinError(
+                    f"Don't know what to do with step_type {self.step_type}. "
+                    "This is one of the supported reading modes, but maybe it "
+                    "was not properly coded. If you did the change yourself, check "
+                    "that you added the behaviour of the new mode to method "
+                    "`rebin_spectra`. Otherwise contact 'stacking' developpers."
+                )
+
+            rebinned_flux, rebinned_ivar = rebin_multiple(
+                np.concatenate([spectrum.flux for spectrum in batch]),
+                np.concatenate([spectrum.ivar for spectrum in batch]),
+                wavelength,
+                sizes,
+                self.common_wavelength_grid,
+            )
+
+            for index, spectrum in enumerate(batch):
+                spectrum.set_flux_ivar_common_grid(rebinned_flux[index],
+                                                   rebinned_ivar[index])
+
     def __parse_config(self, config):
         """Parse the configuration options
 
@@ -214,7 +259,7 @@ class Rebin:
                 "Otherwise contact 'stacking' developpers.")
 
 
-@njit()
+@njit(cache=True)
 def find_bins(original_array, grid_array):
     """For each element in original_array, find the corresponding bin in grid_array
 
@@ -239,7 +284,7 @@ def find_bins(original_array, grid_array):
     return found_bin
 
 
-@njit
+@njit(cache=True)
 def rebin(flux, ivar, wavelength, common_wavelength_grid):
     """Rebin the arrays and update control variables
     Rebinned arrays are flux, ivar, lambda_ or log_lambda, and
@@ -290,3 +335,57 @@ def rebin(flux, ivar, wavelength, common_wavelength_grid):
     rebin_flux[pos] /= rebin_ivar[pos]
 
     return rebin_flux, rebin_ivar
+
+
+@njit(cache=True)
+def rebin_multiple(flux, ivar, wavelength, sizes, common_wavelength_grid):
+    """Rebin the arrays of multiple spectra. This is the batched version of
+    function rebin
+
+    Arguments
+    ---------
+    flux: array of float
+    Concatenated flux of all the spectra
+
+    ivar: array of float
+    Concatenated inverse variance of all the spectra
+
+    wavelength: array of float
+    Concatenated wavelength (in Angstroms) of all the spectra
+
+    sizes: array of int
+    Number of pixels of each spectrum
+
+    common_wavelength_grid: array of float
+    The common wavelength grid (in Angstroms)
+
+    Return
+    ------
+    flux: array of float
+    Rebinned version of input flux. Shape is (number of spectra, size of the
+    common grid)
+
+    ivar: array of float
+    Rebinned version of input ivar. Shape is (number of spectra, size of the
+    common grid)
+    """
+    rebin_flux = np.zeros((sizes.size, common_wavelength_grid.size))
+    rebin_ivar = np.zeros((sizes.size, common_wavelength_grid.size))
+
+    bins = find_bins(wavelength, common_wavelength_grid)
+
+    start = 0
+    for index in range(sizes.size):
+        # rebin flux and ivar
+        for pixel in range(start, start + sizes[index]):
+            if 0 < bins[pixel] < common_wavelength_grid.size:
+                rebin_flux[index, bins[pixel]] += ivar[pixel] * flux[pixel]
+                rebin_ivar[index, bins[pixel]] += ivar[pixel]
+        start += sizes[index]
+
+        # normalize rebinned flux
+        for bin_index in range(common_wavelength_grid.size):
+            if rebin_ivar[index, bin_index] != 0.0:
+                rebin_flux[index, bin_index] /= rebin_ivar[index, bin_index]
+
+    return rebin_flux, rebin_ivar
@@ -20,10 +20,13 @@ class Stacker:
     Attributes
     ----------
     stacked_flux: array of float
-    The stacked flux
+    The stacked flux. Stackers used to build a larger stack (see SplitStacker)
+    fill this array in place, so that it can be a view of the parent's array
 
     stacked_weight: array of float
-    The sum of weights associated with each flux
+    The sum of weights associated with each flux. Stackers used to build a
+    larger stack (see SplitStacker) fill this array in place, so that it can
+    be a view of the parent's array
     """
 
     def __init__(self, config):  # pylint: disable=unused-argument
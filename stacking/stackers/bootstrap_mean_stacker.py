@@ -1,5 +1,6 @@
 """ This module defines the class BootstrapMeanStacker to compute the stack
 (including bootstrap errors) using the mean of the stacked values"""
+from copy import deepcopy
 
 from stacking.stackers.mean_stacker import MeanStacker
 from stacking.stackers.mean_stacker import defaults as defaults_mean_stacker
@@ -48,6 +49,8 @@ class BootstrapMeanStacker(BootstrapStacker):
         super().__init__(config)
 
         self.main_stacker = MeanStacker(config)
+        # the bootstrap stackers share the configuration of the main stacker,
+        # replicate it instead of parsing the configuration again
         self.bootstrap_stackers = [
-            MeanStacker(config) for _ in range(self.num_bootstrap)
+            deepcopy(self.main_stacker) for _ in range(self.num_bootstrap)
         ]
@@ -56,6 +56,12 @@ class BootstrapSplitMeanStacker(BootstrapStacker):
         self.bootstrap_stackers = [
             SplitMeanStacker(config,
                              groups_info=self.main_stacker.groups_info,
-                             split_catalogue=self.main_stacker.split_catalogue)
+                             split_catalogue=self.main_stacker.split_catalogue,
+                             group_matrix=self.main_stacker.group_matrix)
             for _ in range(self.num_bootstrap)
         ]
+        # the realizations are stacked one after the other, running each of
+        # them in its own pool of processes is more expensive than stacking
+        # their groups serially
+        for stacker in self.bootstrap_stackers:
+            stacker.num_processors = 1
@@ -87,11 +87,12 @@ class MeanStacker(Stacker):
             (1 + self.sigma_i2 * spectrum.ivar_common_grid)
             for spectrum in spectra
         ])
-        self.stacked_flux = np.nansum(
-            np.stack([spectrum.normalized_flux for spectrum in spectra]) *
-            weights,
-            axis=0)
-        self.stacked_weight = np.nansum(weights, axis=0)
+        # results are written in place (see Stacker)
+        np.nansum(np.stack([spectrum.normalized_flux for spectrum in spectra]) *
+                  weights,
+                  axis=0,
+                  out=self.stacked_flux)
+        np.nansum(weights, axis=0, out=self.stacked_weight)
 
         # normalize
         good_pixels = np.where(self.stacked_weight != 0.0)
@@ -89,12 +89,15 @@ class MedianStacker(Stacker):
                 warnings.filterwarnings("ignore",
                                         message="All-NaN slice encountered")
 
-                self.stacked_flux = np.nanmedian(np.stack([
+                # results are written in place (see Stacker)
+                np.nanmedian(np.stack([
                     spectrum.normalized_flux / (spectrum.ivar_common_grid != 0)
                     for spectrum in spectra
                 ]),
-                                                 axis=0)
+                             axis=0,
+                             out=self.stacked_flux)
 
-            self.stacked_weight = np.nansum(np.stack(
+            np.nansum(np.stack(
                 [spectrum.ivar_common_grid for spectrum in spectra]),
-                                            axis=0)
+                      axis=0,
+                      out=self.stacked_weight)
@@ -41,12 +41,9 @@ class MergeMeanStacker(MergeStacker):
                 "persists")
 
         # combine the stacks
-        self.stacked_flux = np.nansum(np.stack(
-            [flux * weight for (flux, weight) in self.stacks]),
+        self.stacked_flux = np.nansum(self.stacks_flux * self.stacks_weight,
                                       axis=0)
-        self.stacked_weight = np.nansum(np.stack(
-            [weight for (_, weight) in self.stacks]),
-                                        axis=0)
+        self.stacked_weight = np.nansum(self.stacks_weight, axis=0)
 
         # normalize
         good_pixels = np.where(self.stacked_weight != 0.0)
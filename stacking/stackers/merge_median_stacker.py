@@ -60,9 +60,5 @@ class MergeMedianStacker(MergeStacker, MedianStacker):
             # TODO: compute weighted median
             raise StackerError("Not implemented")
         else:
-            self.stacked_flux = np.nanmedian(np.stack(
-                [flux for (flux, _) in self.stacks]),
-                                             axis=0)
-            self.stacked_weight = np.nansum(np.stack(
-                [weight for (_, weight) in self.stacks]),
-                                            axis=0)
+            self.stacked_flux = np.nanmedian(self.stacks_flux, axis=0)
+            self.stacked_weight = np.nansum(self.stacks_weight, axis=0)
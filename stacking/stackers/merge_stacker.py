@@ -1,10 +1,8 @@
 """ This module defines the abstract class MergeStacker to compute the stack
 using different partial runs"""
-import os
-
 from stacking.errors import StackerError
 from stacking.stacker import Stacker, accepted_options, defaults, required_options
-from stacking.stackers.merge_stacker_utils import load_stacks
+from stacking.stackers.merge_stacker_utils import find_existing_files, load_stacks
 from stacking.utils import (update_accepted_options, update_default_options,
                             update_required_options)
 
@@ -32,6 +30,7 @@ class MergeStacker(Stacker):
     (see Stacker in stacking/stacker.py)
     __init__
     __parse_config
+    stacks
 
     Attributes
     ----------
@@ -46,7 +45,15 @@ class MergeStacker(Stacker):
 
     stacks: list of (array of float, array of float)
     Individual stacks to be merged. Each item contains a tuple with the flux
-    and weight arrays
+    and weight arrays. Read-only view of stacks_flux and stacks_weight kept for
+    backwards compatibility
+
+    stacks_flux: array of float
+    Fluxes of the individual stacks to be merged. The first axis runs over the
+    files in stack_list
+
+    stacks_weight: array of float
+    Weights of the individual stacks to be merged. Same shape as stacks_flux
     """
 
     def __init__(self, config):
@@ -67,7 +74,20 @@ class MergeStacker(Stacker):
         self.hdu_name = None
         self.__parse_config(config)
 
-        self.stacks = load_stacks(self.stack_list, hdu_name=self.hdu_name)
+        self.stacks_flux, self.stacks_weight = load_stacks(
+            self.stack_list, hdu_name=self.hdu_name)
+
+    @property
+    def stacks(self):
+        """Individual stacks to be merged as a list of (flux, weight) tuples
+
+        Return
+        ------
+        stacks: list of (array of float, array of float)
+        Individual stacks to be merged. Each item contains a tuple with the flux
+        and weight arrays
+        """
+        return list(zip(self.stacks_flux, self.stacks_weight))
 
     def __parse_config(self, config):
         """Parse the configuration options
@@ -93,12 +113,12 @@ class MergeStacker(Stacker):
             raise StackerError("Missing argument 'stack list' required by "
                                "MergeStacker")
         self.stack_list = stack_list.split()
+        existing_files = find_existing_files(self.stack_list)
         for stack_file in self.stack_list:
-            if not os.path.exists(stack_file):
+            if stack_file not in existing_files:
                 raise StackerError(
                     f"Could not find file '{stack_file}' required by "
                     "MergeStacker")
-            if not (stack_file.endswith(".fits") or
-                    stack_file.endswith(".fits.gz")):
+            if not stack_file.endswith((".fits", ".fits.gz")):
                 raise StackerError(
                     f"MergeStacker: Expected a fits file, found {stack_file}")
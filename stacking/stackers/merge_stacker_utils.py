@@ -1,12 +1,65 @@
 """ This module defines the abstract class MergeStacker to compute the stack
 using different partial runs"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os
+
 from astropy.io import fits
-from astropy.table import Table
 import numpy as np
+import pandas as pd
 
 from stacking.errors import StackerError
 from stacking.spectrum import Spectrum
 
+# Maximum number of stacks kept in memory by read_stack. The cache is local
+# to each process and can be emptied with read_stack_from_disk.cache_clear()
+READ_STACK_CACHE_SIZE = 4
+
+
+def find_existing_files(file_list):
+    """Find which of the files in a list exist.
+
+    Files are grouped by their directory and each directory is listed only
+    once, which is much cheaper than checking the files one by one when many
+    of them share the same directory
+
+    Arguments
+    ---------
+    file_list: list of str
+    The files to check
+
+    Return
+    ------
+    existing_files: set of str
+    The items of file_list that exist
+    """
+    files_by_dir = {}
+    for file in file_list:
+        dirname, basename = os.path.split(file)
+        files_by_dir.setdefault(dirname, []).append((file, basename))
+
+    existing_files = set()
+    for dirname, files in files_by_dir.items():
+        try:
+            with os.scandir(dirname if dirname else ".") as entries:
+                # broken symlinks do not count as existing files
+                present = {
+                    entry.name
+                    for entry in entries
+                    if not entry.is_symlink() or os.path.exists(entry.path)
+                }
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        # directories that can be traversed but not listed
+        except PermissionError:
+            existing_files.update(
+                file for file, _ in files if os.path.exists(file))
+            continue
+        existing_files.update(
+            file for file, basename in files if basename in present)
+
+    return existing_files
+
 
 def load_stacks(stack_list, hdu_name="STACK"):
     """ Load stacks from previous runs
@@ -22,49 +75,147 @@ def load_stacks(stack_list, hdu_name="STACK"):
 
     Return
     ------
-    stacks: list of (array of float, array of float)
-    List of stacks. Each item contains a tuple with the flux and weight arrays
+    stacks_flux: array of float
+    The stacked fluxes. The first axis runs over the files in stack_list, so that
+    stacks_flux[index] contains the flux array read from stack_list[index]
+
+    stacks_weight: array of float
+    The stacked weights. Same shape as stacks_flux
 
     Raise
     -----
+    StackerError if stack_list is empty
     StackerError if the wavelength arrays of the different files are not equal
     """
-    stacks = []
+    if len(stack_list) == 0:
+        raise StackerError(
+            "Error loading stacked spectra. The list of stacks is empty")
 
-    for file in stack_list:
-        hdul = fits.open(file)
+    stacks_flux = None
+    stacks_weight = None
+
+    # read the files in a background thread so that reading (and decompressing)
+    # file index + 1 overlaps with the checks done on file index
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_stack = executor.submit(read_stack, stack_list[0], hdu_name)
+
+        for index in range(len(stack_list)):
+            wavelength, flux, weight = next_stack.result()
+            if index + 1 < len(stack_list):
+                next_stack = executor.submit(read_stack, stack_list[index + 1],
+                                             hdu_name)
+
+            # check wavelength grid
+            if Spectrum.common_wavelength_grid is None:
+                Spectrum.set_common_wavelength_grid(wavelength)
+            elif Spectrum.common_wavelength_grid.size != wavelength.size:
+                raise StackerError(
+                    "Error loading stacked spectra. Expecting the stacks to have the "
+                    "same wavelengths, but found wavelength grids of different sizes "
+                    f"({Spectrum.common_wavelength_grid.size} and {wavelength.size})"
+                )
+            elif not np.allclose(Spectrum.common_wavelength_grid, wavelength):
+                error_message = (
+                    "Error loading stacked spectra. Expecting the stacks to have the "
+                    "same wavelengths, but found differnt wavelength grids:\n"
+                    "wave1 wave2 areclose\n")
+                for item1, item2 in zip(Spectrum.common_wavelength_grid,
+                                        wavelength):
+                    error_message += f"{item1} {item2} {np.isclose(item1, item2)}\n"
+
+                raise StackerError(error_message)
+
+            # allocate the arrays once we know the shape of the stacks
+            # use double precision so that no file is downcasted
+            if stacks_flux is None:
+                stacks_flux = np.empty((len(stack_list),) + flux.shape,
+                                       dtype=float)
+                stacks_weight = np.empty((len(stack_list),) + weight.shape,
+                                         dtype=float)
+
+            # add to arrays
+            stacks_flux[index] = flux
+            stacks_weight[index] = weight
+
+    return stacks_flux, stacks_weight
+
+
+def read_stack(file, hdu_name="STACK"):
+    """ Read a stack from a previous run
+
+    Stacks are cached (see read_stack_from_disk) so that repeated merges of
+    the same files, e.g. in parameter sweeps, do not read them again. The
+    cache is keyed by the file modification time and size, so that it is
+    invalidated when the file changes. It only keeps the last
+    READ_STACK_CACHE_SIZE stacks and can be emptied calling
+    read_stack_from_disk.cache_clear()
+
+    Arguments
+    ---------
+    file: str
+    Fits file containing the stack
+
+    hdu_name: str - Default: "STACK"
+    Name of the HDU containing the spectra to load
+
+    Return
+    ------
+    wavelength: array of float
+    The wavelength array. Read-only
+
+    flux: array of float
+    The stacked flux. Read-only
+
+    weight: array of float
+    The stacked weight. Read-only
+    """
+    file_stat = os.stat(file)
+    return read_stack_from_disk(os.path.abspath(file), hdu_name,
+                                file_stat.st_mtime_ns, file_stat.st_size)
+
+
+@lru_cache(maxsize=READ_STACK_CACHE_SIZE)
+def read_stack_from_disk(file, hdu_name, mtime, size):  # pylint: disable=unused-argument
+    """ Read a stack from a previous run. Results are cached
+
+    Arguments
+    ---------
+    file: str
+    Fits file containing the stack. Should be an absolute path
+
+    hdu_name: str
+    Name of the HDU containing the spectra to load
+
+    mtime: int
+    Modification time of the file (in ns). Only used as part of the cache key
+
+    size: int
+    Size of the file (in bytes). Only used as part of the cache key
+
+    Return
+    ------
+    wavelength: array of float
+    The wavelength array. Read-only
 
+    flux: array of float
+    The stacked flux. Read-only
+
+    weight: array of float
+    The stacked weight. Read-only
+    """
+    with fits.open(file) as hdul:
         # disabling pylint no-members as they are false positives here
-        wavelength = hdul[hdu_name].data["WAVELENGTH"]  # pylint: disable=no-member
-        flux = hdul[hdu_name].data["STACKED_FLUX"]  # pylint: disable=no-member
-        weight = hdul[hdu_name].data["STACKED_WEIGHT"]  # pylint: disable=no-member
-
-        hdul.close()
-
-        # check wavelength grid
-        if Spectrum.common_wavelength_grid is None:
-            Spectrum.set_common_wavelength_grid(wavelength)
-        elif Spectrum.common_wavelength_grid.size != wavelength.size:
-            raise StackerError(
-                "Error loading stacked spectra. Expecting the stacks to have the "
-                "same wavelengths, but found wavelength grids of different sizes "
-                f"({Spectrum.common_wavelength_grid.size} and {wavelength.size})"
-            )
-        elif not np.allclose(Spectrum.common_wavelength_grid, wavelength):
-            error_message = (
-                "Error loading stacked spectra. Expecting the stacks to have the "
-                "same wavelengths, but found differnt wavelength grids:\n"
-                "wave1 wave2 areclose\n")
-            for item1, item2 in zip(Spectrum.common_wavelength_grid,
-                                    wavelength):
-                error_message += f"{item1} {item2} {np.isclose(item1, item2)}\n"
-
-            raise StackerError(error_message)
-
-        # add to list
-        stacks.append((flux, weight))
-
-    return stacks
+        data = hdul[hdu_name].data  # pylint: disable=no-member
+        # copy the arrays so that they remain valid once the file is closed
+        wavelength = np.array(data["WAVELENGTH"])
+        flux = np.array(data["STACKED_FLUX"])
+        weight = np.array(data["STACKED_WEIGHT"])
+
+    # the arrays are shared by all the callers, protect them
+    for array in (wavelength, flux, weight):
+        array.flags.writeable = False
+
+    return wavelength, flux, weight
 
 
 def load_splits_info(stack_list):
@@ -97,13 +248,11 @@ def load_splits_info(stack_list):
 
     for file in stack_list:
         # read data from file
-        groups_info_file = Table.read(file, hdu="GROUPS_INFO").to_pandas()
-        split_catalogue_file = Table.read(file,
-                                          hdu="METADATA_SPECTRA").to_pandas()
-        hdul = fits.open(file)
-        # disabling pylint no-members as they are false positives here
-        num_groups_file = hdul["GROUPS_INFO"].header["NGROUPS"]  # pylint: disable=no-member
-        hdul.close()
+        with fits.open(file) as hdul:
+            groups_info_file = table_hdu_to_pandas(hdul["GROUPS_INFO"])
+            split_catalogue_file = table_hdu_to_pandas(hdul["METADATA_SPECTRA"])
+            # disabling pylint no-members as they are false positives here
+            num_groups_file = hdul["GROUPS_INFO"].header["NGROUPS"]  # pylint: disable=no-member
 
         # now check that files are compatible
         if groups_info is None:
@@ -135,3 +284,35 @@ def load_splits_info(stack_list):
                 "IN_STACK"] | split_catalogue_file["IN_STACK"]
 
     return groups_info, num_groups, split_catalogue
+
+
+def table_hdu_to_pandas(hdu):
+    """Load the contents of a table HDU into a pandas DataFrame
+
+    This skips the construction of an intermediate astropy Table. Numeric
+    columns are converted to native byte order and string columns are kept
+    as (right-stripped) bytes, as astropy.table.Table.to_pandas would do
+
+    Arguments
+    ---------
+    hdu: fits.BinTableHDU
+    The table HDU
+
+    Return
+    ------
+    data_frame: pd.DataFrame
+    The loaded data
+    """
+    # disabling pylint no-members as they are false positives here
+    data = hdu.data  # pylint: disable=no-member
+    raw_data = data.view(np.ndarray)
+    columns = {}
+    for name in data.names:
+        if raw_data.dtype[name].kind == "S":
+            columns[name] = np.char.rstrip(raw_data[name])
+        else:
+            column = data[name]
+            columns[name] = column.astype(column.dtype.newbyteorder("="),
+                                          copy=False)
+
+    return pd.DataFrame(columns)
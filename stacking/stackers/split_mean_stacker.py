@@ -1,6 +1,7 @@
 """ This module defines the class SplitMeanStacker to compute multiple
 stacks splitting on one or more properties of the spectra using the mean of the
 stacked values"""
+from copy import deepcopy
 
 from stacking.stackers.mean_stacker import MeanStacker
 from stacking.stackers.mean_stacker import defaults as defaults_mean_stacker
@@ -38,7 +39,11 @@ class SplitMeanStacker(SplitStacker):
     Must be initialized by the child class
     """
 
-    def __init__(self, config, groups_info=None, split_catalogue=None):
+    def __init__(self,
+                 config,
+                 groups_info=None,
+                 split_catalogue=None,
+                 group_matrix=None):
         """Initialize class instance
 
         Arguments
@@ -53,9 +58,21 @@ class SplitMeanStacker(SplitStacker):
         split_catalogue: pd.DataFrame or None - default: None
         If not None, then the catalogue will be read from split_catalogue_name
         Otherwise, this must be pandas DataFrame with the previously read catalogue
+
+        group_matrix: array of int or None - default: None
+        If None, then the group membership matrix will be computed upon
+        initialization. Otherwise, this must be the previously computed matrix
+        (see attribute group_matrix). Used to share the matrix between stackers
+        with the same catalogue
         """
         super().__init__(config,
                          groups_info=groups_info,
-                         split_catalogue=split_catalogue)
+                         split_catalogue=split_catalogue,
+                         group_matrix=group_matrix)
 
-        self.stackers = [MeanStacker(config) for _ in range(self.num_groups)]
+        # parse the configuration only once and replicate the parsed stacker
+        # for all the groups
+        group_stacker = MeanStacker(config)
+        self.stackers = [
+            deepcopy(group_stacker) for _ in range(self.num_groups)
+        ]
@@ -2,8 +2,10 @@
 stacks splitting on one or more properties of the spectra"""
 
 import logging
+import multiprocessing
+import os
 
-from astropy.table import Table
+import fitsio
 import numpy as np
 import pandas as pd
 
@@ -12,12 +14,16 @@ from stacking.spectrum import Spectrum
 from stacking.stacker import Stacker
 from stacking.stacker import defaults, accepted_options, required_options
 from stacking.stackers.split_stacker_utils import (
+    GROUPS_TO_STACK,
     assign_group_multiple_cuts,
     assign_group_one_cut,
+    downcast_column,
     extract_split_cut_sets,
+    find_catalogue_rows,
     format_split_on,
     format_splits,
-    retreive_group_number,
+    group_number_dtype,
+    stack_group,
 )
 from stacking.utils import (update_accepted_options, update_default_options,
                             update_required_options)
@@ -38,6 +44,9 @@ accepted_options = update_accepted_options(
         "catalogue HDU name or number": (
             "Name or number of the HDU in `split_catalogue_name` that contains "
             "the actual catalogue to split. **Type: str**"),
+        "num processors":
+            ("Number of processors to use when stacking the different groups. "
+             "**Type: int**"),
         "specid name":
             "Name of the column containing the identifier SPECID. **Type: str**",
         "split catalogue name":
@@ -77,6 +86,7 @@ class SplitStacker(Stacker):
     __init__
     __parse_config
     assing_groups
+    compute_group_matrix
     read_catalogue
     stack
 
@@ -91,12 +101,20 @@ class SplitStacker(Stacker):
     logger: logging.Logger
     Logger object
 
+    group_matrix: array of int
+    Matrix of shape (number of catalogue entries, num_groups) with a 1 in
+    position [i, j] if the i-th catalogue entry belongs to group j, and 0
+    otherwise
+
     groups_info: pd.DataFrame
     DataFrame containing the group information
 
     num_groups: int
     Number of groups the data is split on
 
+    num_processors: int
+    Number of processors to use when stacking the different groups
+
     specid_name: str
     Name of the column containing the identifier SPECID
 
@@ -126,7 +144,11 @@ class SplitStacker(Stacker):
     Must be initialized by the child class
     """
 
-    def __init__(self, config, groups_info=None, split_catalogue=None):
+    def __init__(self,
+                 config,
+                 groups_info=None,
+                 split_catalogue=None,
+                 group_matrix=None):
         """Initialize class instance
 
         Arguments
@@ -141,11 +163,18 @@ class SplitStacker(Stacker):
         split_catalogue: pd.DataFrame or None - default: None
         If not None, then the catalogue will be read from split_catalogue_name
         Otherwise, this must be pandas DataFrame with the previously read catalogue
+
+        group_matrix: array of int or None - default: None
+        If None, then the group membership matrix will be computed upon
+        initialization. Otherwise, this must be the previously computed matrix
+        (see attribute group_matrix). Used to share the matrix between stackers
+        with the same catalogue
         """
         self.logger = logging.getLogger(__name__)
         super().__init__(config)
 
         self.catalogue_hdu_name_or_number = None
+        self.num_processors = None
         self.specid_name = None
         self.split_catalogue_name = None
         self.split_on = None
@@ -168,6 +197,13 @@ class SplitStacker(Stacker):
             self.num_groups = groups_info.shape[0]
             self.groups_info = groups_info
 
+        # keep the group membership of each catalogue entry
+        if group_matrix is None:
+            self.group_matrix = None
+            self.compute_group_matrix()
+        else:
+            self.group_matrix = group_matrix
+
         # This needs to be defined in the child class
         self.stackers = []
 
@@ -184,6 +220,7 @@ class SplitStacker(Stacker):
         StackerError upon missing required variables
         StackerError if variables are not properly formatted
         StackerError if variables are not coherent
+        StackerError if the split cuts are not strictly increasing
         """
         self.catalogue_hdu_name_or_number = config.get(
             "catalogue HDU name or number")
@@ -239,6 +276,20 @@ class SplitStacker(Stacker):
                 "character ';'. Cut values within a given set should be delimited "
                 "by commas and/or whitespaces)")
         self.splits = format_splits(split_cuts_sets)
+        for variable, splits_variable in zip(self.split_on, self.splits):
+            if np.any(np.diff(splits_variable) <= 0):
+                raise StackerError(
+                    "Invalid value for argument 'split cuts' required by "
+                    "SplitStacker. Cuts must be strictly increasing. Found "
+                    f"cuts {splits_variable.tolist()} for variable '{variable}'"
+                )
+
+        self.num_processors = config.getint("num processors")
+        if self.num_processors is None:
+            raise StackerError("Missing argument 'num processors' required by "
+                               "SplitStacker")
+        if self.num_processors == 0:
+            self.num_processors = multiprocessing.cpu_count() // 2
 
     def assing_groups(self):
         """Assign groups to the catalogue entries. Store the total number of groups
@@ -253,12 +304,9 @@ class SplitStacker(Stacker):
         if self.split_type == "OR":
             groups = []
             for index, variable in enumerate(self.split_on):
-                self.split_catalogue[
-                    f"GROUP_{index}"] = self.split_catalogue.apply(
-                        assign_group_one_cut,
-                        axis=1,
-                        args=(variable, self.splits[index], self.num_groups),
-                    )
+                self.split_catalogue[f"GROUP_{index}"] = assign_group_one_cut(
+                    self.split_catalogue, variable, self.splits[index],
+                    self.num_groups)
                 # keep grouping info
                 groups += [[
                     variable, min_value, max_value, f"GROUP_{index}",
@@ -268,6 +316,12 @@ class SplitStacker(Stacker):
                 # update num_groups
                 self.num_groups += self.splits[index].size - 1
 
+            # store the group numbers in the smallest type that fits them
+            dtype = group_number_dtype(self.num_groups)
+            for index in range(len(self.split_on)):
+                self.split_catalogue[f"GROUP_{index}"] = self.split_catalogue[
+                    f"GROUP_{index}"].astype(dtype)
+
             self.groups_info = pd.DataFrame(data=groups,
                                             columns=[
                                                 "VARIABLE", "MIN_VALUE",
@@ -280,14 +334,13 @@ class SplitStacker(Stacker):
                 for index in range(len(self.split_on))
             ])
 
-            self.split_catalogue["GROUP"] = self.split_catalogue.apply(
-                assign_group_multiple_cuts,
-                axis=1,
-                args=(self.split_on, self.splits, num_intervals),
-            )
-
             self.num_groups = np.prod(num_intervals)
 
+            # store the group numbers in the smallest type that fits them
+            self.split_catalogue["GROUP"] = assign_group_multiple_cuts(
+                self.split_catalogue, self.split_on, self.splits,
+                num_intervals).astype(group_number_dtype(self.num_groups))
+
             groups = []
             for group_number in range(self.num_groups):
                 aux_groups = [group_number]
@@ -323,6 +376,35 @@ class SplitStacker(Stacker):
 
         self.logger.progress("Groups assigned")
 
+    def compute_group_matrix(self):
+        """Compute the group membership matrix of the catalogue entries from
+        the group columns of the catalogue
+        """
+        if self.split_type == "OR":
+            group_cols = self.groups_info["COLNAME"].unique()
+        elif self.split_type == "AND":
+            group_cols = ["GROUP"]
+
+        # this should never enter unless new split types are not properly added
+        else:  # pragma: no cover
+            raise StackerError(
+                f"Don't know what to do with split type {self.split_type}. "
+                "This is one of the supported split types, maybe it "
+                "was not properly coded. If you did the change yourself, check "
+                "that you added the behaviour of the new mode to method "
+                "`compute_group_matrix`. Otherwise contact 'stacking' developpers."
+            )
+
+        # column-major so that the entries of a group are contiguous
+        self.group_matrix = np.zeros(
+            (self.split_catalogue.shape[0], self.num_groups),
+            dtype=np.int8,
+            order="F")
+        for col in group_cols:
+            groups = self.split_catalogue[col].to_numpy()
+            rows = np.nonzero(groups != -1)[0]
+            self.group_matrix[rows, groups[rows]] = 1
+
     def read_catalogue(self):
         """Read the catalogue to do the splits
 
@@ -339,37 +421,47 @@ class SplitStacker(Stacker):
                              self.split_catalogue_name)
         self.logger.progress("Reading HDU '%s'",
                              self.catalogue_hdu_name_or_number)
+        if not os.path.isfile(self.split_catalogue_name):
+            raise StackerError("SplitStacker: Could not find catalogue: "
+                               f"{self.split_catalogue_name}")
+
+        # only the required columns are read from disk
+        keep_columns = self.split_on + [self.specid_name]
         try:
-            catalogue = Table.read(self.split_catalogue_name,
-                                   hdu=self.catalogue_hdu_name_or_number)
-        # we are currently not accessing this as astropy reads the first HDU
-        # when it does not find the correct key. However, we do not delete this
-        # check as it is currently raining a DeprecationWarning that will soon
-        # turn to an error
-        except KeyError:  # pragma: no cover
+            catalogue = fitsio.read(self.split_catalogue_name,
+                                    ext=self.catalogue_hdu_name_or_number,
+                                    columns=keep_columns)
+        except OSError:
             self.logger.warning(
                 "Error reading HDU '%s'. Maybe it is was a name but rather a "
                 "number. I will try this and come back to you",
                 self.catalogue_hdu_name_or_number)
             try:
-                catalogue = Table.read(self.split_catalogue_name,
-                                       hdu=int(
-                                           self.catalogue_hdu_name_or_number))
-            except ValueError as error:
+                catalogue = fitsio.read(self.split_catalogue_name,
+                                        ext=int(
+                                            self.catalogue_hdu_name_or_number),
+                                        columns=keep_columns)
+            except (ValueError, OSError) as error:
                 raise StackerError(
                     "SplitStacker: Problem reading HDU "
                     f"{self.catalogue_hdu_name_or_number}") from error
             self.logger.ok_warning("Catalogue read properly")
 
-        except FileNotFoundError as error:
-            raise StackerError("SplitStacker: Could not find catalogue: "
-                               f"{self.split_catalogue_name}") from error
-
-        keep_columns = self.split_on + [self.specid_name]
-
-        split_catalogue = catalogue[keep_columns].to_pandas()
+        # fitsio matches column names case-insensitively and returns them
+        # in the order they are stored in the file
+        names = {name.upper(): name for name in catalogue.dtype.names}
+        columns = {}
+        for col in keep_columns:
+            values = catalogue[names[col.upper()]]
+            columns[col] = values.astype(values.dtype.newbyteorder("="),
+                                         copy=False)
+        split_catalogue = pd.DataFrame(columns)
         split_catalogue.rename(columns={self.specid_name: "SPECID"},
                                inplace=True)
+        # 64-bit columns are downcasted only when no precision is lost,
+        # so the group assignment is not affected
+        for col in split_catalogue.columns:
+            split_catalogue[col] = downcast_column(split_catalogue[col])
         split_catalogue["IN_STACK"] = False
 
         self.logger.progress("Catalogue read")
@@ -398,41 +490,55 @@ class SplitStacker(Stacker):
             (Spectrum.common_wavelength_grid.size, self.num_groups),
             dtype=float)
         self.stacked_weight = np.zeros_like(self.stacked_flux)
-
-        for group_number, stacker in enumerate(self.stackers):
-
-            # select the spectra of this particular groups
-            if self.split_type == "OR":
-                col = self.groups_info[self.groups_info["GROUP_NUM"] ==
-                                       group_number]["COLNAME"].values[0]
-            elif self.split_type == "AND":
-                col = "GROUP"
-
-            # this should never enter unless new split types are not properly added
-            else:  # pragma: no cover
-                raise StackerError(
-                    f"Don't know what to do with split type {self.split_type}. "
-                    "This is one of the supported split types, maybe it "
-                    "was not properly coded. If you did the change yourself, check "
-                    "that you added the behaviour of the new mode to method `stack`. "
-                    "Otherwise contact 'stacking' developpers.")
-
-            selected_spectra = [
-                spectrum for spectrum in spectra if retreive_group_number(
-                    spectrum.specid, self.split_catalogue["SPECID"].values,
-                    self.split_catalogue[col].values) == group_number
-            ]
-
-            # run the stack
-            stacker.stack(selected_spectra)
-
-            self.stacked_flux[:, group_number] = stacker.stacked_flux
-            self.stacked_weight[:, group_number] = stacker.stacked_weight
-
-            # update statistics
-            selected_specids = [
-                spectrum.specid for spectrum in selected_spectra
-            ]
-            self.split_catalogue.loc[
-                self.split_catalogue["SPECID"].isin(selected_specids),
-                "IN_STACK"] = True
+        self.stacked_error = np.zeros_like(self.stacked_flux)
+
+        # find the group membership of each spectrum
+        spectra_specids = np.fromiter((spectrum.specid for spectrum in spectra),
+                                      dtype=np.int64,
+                                      count=len(spectra))
+        rows = find_catalogue_rows(spectra_specids,
+                                   self.split_catalogue["SPECID"].to_numpy())
+        found = np.nonzero(rows != -1)[0]
+        found_rows = rows[found]
+
+        # select the spectra of each group
+        in_stack = np.zeros(len(spectra), dtype=bool)
+        groups_spectra = []
+        for group_number in range(self.num_groups):
+            indexs = found[self.group_matrix[found_rows, group_number] == 1]
+            in_stack[indexs] = True
+            groups_spectra.append([spectra[index] for index in indexs])
+
+        # the groups are independent, so they can be stacked in parallel
+        if self.num_processors > 1 and self.num_groups > 1:
+            # the workers inherit the groups when forked, so only the group
+            # numbers are sent to them
+            GROUPS_TO_STACK.extend(zip(self.stackers, groups_spectra))
+            try:
+                context = multiprocessing.get_context('fork')
+                with context.Pool(processes=min(self.num_processors,
+                                                self.num_groups)) as pool:
+                    results = pool.map(stack_group, range(self.num_groups))
+            finally:
+                GROUPS_TO_STACK.clear()
+            for group_number, (stacker, (stacked_flux, stacked_weight)) in \
+                    enumerate(zip(self.stackers, results)):
+                self.stacked_flux[:, group_number] = stacked_flux
+                self.stacked_weight[:, group_number] = stacked_weight
+                stacker.stacked_flux = self.stacked_flux[:, group_number]
+                stacker.stacked_weight = self.stacked_weight[:, group_number]
+        else:
+            for group_number, stacker in enumerate(self.stackers):
+                # the stacker fills its results in place, so pointing them to
+                # this group's column avoids keeping (and copying) a second
+                # version of the results
+                stacker.stacked_flux = self.stacked_flux[:, group_number]
+                stacker.stacked_weight = self.stacked_weight[:, group_number]
+
+                # run the stack
+                stacker.stack(groups_spectra[group_number])
+
+        # update statistics
+        self.split_catalogue.loc[
+            self.split_catalogue["SPECID"].isin(spectra_specids[in_stack]),
+            "IN_STACK"] = True
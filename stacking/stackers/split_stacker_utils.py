@@ -4,6 +4,16 @@ import re
 import numpy as np
 from numba import njit
 
+BRACKETS_TABLE = str.maketrans("", "", "[]")
+SPLIT_CUT_SETS_SEPARATOR = re.compile(r"[ \t]*;[ \t]*")
+SPLIT_CUTS_SEPARATOR = re.compile(r"[ \t]*[, ]+[ \t]*")
+SPLIT_ON_SEPARATOR = re.compile(r"[, ;]+")
+
+# (stacker, spectra) pairs of the groups being stacked in parallel. This is
+# filled before forking the worker processes so that they inherit it and
+# only the group numbers need to be sent to them
+GROUPS_TO_STACK = []
+
 VALID_SPLIT_TYPES = [
     # the split will be performed independently in the different variables,
     # thus, a spectrum can enter multiple splits
@@ -14,13 +24,14 @@ VALID_SPLIT_TYPES = [
 ]
 
 
-def assign_group_multiple_cuts(row, variables, intervals, num_intervals):
-    """Assign a group number based on the value stored in row[variable]
+def assign_group_multiple_cuts(catalogue, variables, intervals, num_intervals):
+    """Assign a group number to every catalogue entry based on the values stored
+    in catalogue[variables]
 
     Arguments
     ---------
-    row: pd.Series
-    A dataframe row
+    catalogue: pd.DataFrame
+    The catalogue
 
     variables: list of str
     Name of the variables where cuts are applied
@@ -36,32 +47,36 @@ def assign_group_multiple_cuts(row, variables, intervals, num_intervals):
 
     Return
     ------
-    group_number: int
-    The group number. -1 for no group
+    group_numbers: array of int
+    The group number of each entry. -1 for no group
     """
-    variable_indexs = []
+    values = np.array(
+        [catalogue[variable].to_numpy() for variable in variables],
+        dtype=np.float64)
 
-    for variable, intervals_variable in zip(variables, intervals):
-        variable_index = find_interval_index(row[variable], intervals_variable)
-        if variable_index == -1:
-            return -1
-        variable_indexs.append(variable_index)
+    # pad the cuts into a single array so that they can be passed to numba
+    num_cuts = np.array(
+        [intervals_variable.size for intervals_variable in intervals])
+    cuts = np.zeros((len(intervals), num_cuts.max()))
+    for index, intervals_variable in enumerate(intervals):
+        cuts[index, :intervals_variable.size] = intervals_variable
 
-    group_number = np.sum([
-        variable_index * np.prod(num_intervals[:index])
-        for index, variable_index in enumerate(variable_indexs)
-    ])
+    # the group number is the mixed-radix encoding of the variable indexs
+    weights = np.array(
+        [np.prod(num_intervals[:index]) for index in range(len(variables))],
+        dtype=np.int64)
 
-    return group_number
+    return find_group_numbers(values, cuts, num_cuts, weights)
 
 
-def assign_group_one_cut(row, variable, intervals, offset):
-    """Assign a group number based on the value stored in row[variable]
+def assign_group_one_cut(catalogue, variable, intervals, offset):
+    """Assign a group number to every catalogue entry based on the value stored
+    in catalogue[variable]
 
     Arguments
     ---------
-    row: pd.Series
-    A dataframe row
+    catalogue: pd.DataFrame
+    The catalogue
 
     variable: str
     Name of the variable where cuts are applied
@@ -76,16 +91,88 @@ def assign_group_one_cut(row, variable, intervals, offset):
 
     Return
     ------
-    group_number: int
-    The group number. -1 for no group
+    group_numbers: array of int
+    The group number of each entry. -1 for no group
     """
-    index = find_interval_index(row[variable], intervals)
-    if index == -1:
-        return -1
-    return index + offset
+    group_numbers = find_interval_indexs(catalogue[variable].to_numpy(),
+                                         intervals)
+    # add the offset in place, keeping the -1 flags
+    group_numbers[group_numbers != -1] += offset
+    return group_numbers
+
+
+def find_catalogue_rows(specids, catalogue_specids):
+    """Find the catalogue row of each of the specified specids
+
+    Arguments
+    ---------
+    specids: array of int
+    The specids to look for
+
+    catalogue_specids: array of int
+    The specids in the catalogue
+
+    Return
+    ------
+    rows: array of int
+    The catalogue row of each specid. -1 for specids not in the catalogue
+    """
+    # bring both sets of specids to a common type before sorting, otherwise
+    # np.searchsorted would make a cast copy of the sorted specids
+    dtype = np.result_type(catalogue_specids, specids)
+    catalogue_specids = catalogue_specids.astype(dtype, copy=False)
+    # the catalogue rows play the role of group numbers
+    sorted_specids, sorted_rows = sort_specids(
+        catalogue_specids, np.arange(catalogue_specids.size))
+    return retreive_group_numbers(specids, sorted_specids, sorted_rows)
 
 
-@njit
+@njit(cache=True)
+def find_group_numbers(values, cuts, num_cuts, weights):
+    """Find the group number of a set of entries splitted using multiple
+    variables
+
+    Arguments
+    ---------
+    values: array of float
+    Values of the variables for each entry. Shape is (number of variables,
+    number of entries)
+
+    cuts: array of float
+    Specified intervals for each variable, padded to the size of the largest
+    set of intervals. Intervals for variable k are cuts[k, :num_cuts[k]].
+    Intervals are defined as [intervals[n], intervals[n-1]].
+    The lower (upper) limit of the interval is included in(excluded of) the interval
+
+    num_cuts: array of int
+    Number of cuts for each variable
+
+    weights: array of int
+    Weight of each variable index in the group number
+
+    Return
+    ------
+    group_numbers: array of int
+    The group number of each entry. -1 for no group
+    """
+    group_numbers = np.empty(values.shape[1], dtype=np.int64)
+    # this runs serially on purpose: numba's threading layers are not
+    # fork-safe and SplitStacker later forks a pool to stack the groups
+    for index in range(values.shape[1]):
+        group_number = 0
+        for variable in range(values.shape[0]):
+            variable_index = find_interval_index(
+                values[variable, index], cuts[variable, :num_cuts[variable]])
+            if variable_index == -1:
+                group_number = -1
+                break
+            group_number += variable_index * weights[variable]
+        group_numbers[index] = group_number
+
+    return group_numbers
+
+
+@njit(cache=True)
 def find_interval_index(value, intervals):
     """Given a set of cuts and a number, find in which interval is the number
     found
@@ -105,15 +192,67 @@ def find_interval_index(value, intervals):
     interva_index: int
     The interval index. -1 if outside the bounds
     """
-    if value < intervals[0]:
+    # reject values outside the bounds (including NaNs) before searching
+    if not intervals[0] <= value < intervals[-1]:
         return -1
+    # binary search over the (sorted) cuts
+    return np.searchsorted(intervals, value, side="right") - 1
+
 
-    for index, (min_value,
-                max_value) in enumerate(zip(intervals[:-1], intervals[1:])):
-        if min_value <= value < max_value:
-            return index
+def find_interval_indexs(values, intervals):
+    """Given a set of cuts and an array of numbers, find in which interval is
+    each of the numbers found. This is the vectorized version of
+    find_interval_index
 
-    return -1
+    Arguments
+    ---------
+    values: array of float
+    The values to check
+
+    intervals: array of float
+    Specified intervals. Intervals are defined as [intervals[n], intervals[n-1]]. The
+    lower (upper) limit of the interval is included in (excluded of) the interval
+    Values outside these intervals will be assinged a -1
+
+    Return
+    ------
+    interval_indexs: array of int
+    The interval indexs. -1 for values outside the bounds
+    """
+    # reject values outside the bounds (including NaNs) with two comparisons
+    # so that only the values within the bounds are searched for
+    in_range = (values >= intervals[0]) & (values < intervals[-1])
+    indexs = np.full(values.shape, -1, dtype=np.int64)
+    indexs[in_range] = np.searchsorted(
+        intervals, values[in_range], side="right") - 1
+    return indexs
+
+
+def downcast_column(column):
+    """Downcast a 64-bit catalogue column to its 32-bit counterpart provided
+    this can be done without any loss of information
+
+    Arguments
+    ---------
+    column: pd.Series
+    The column to downcast
+
+    Return
+    ------
+    downcasted_column: pd.Series
+    The downcasted column. If the column cannot be downcasted without loss of
+    information, the original column is returned
+    """
+    if column.dtype == np.float64:
+        downcasted_column = column.astype(np.float32)
+        if np.array_equal(downcasted_column, column, equal_nan=True):
+            return downcasted_column
+    elif column.dtype == np.int64:
+        int32_info = np.iinfo(np.int32)
+        if column.size == 0 or (column.min() >= int32_info.min and
+                                column.max() <= int32_info.max):
+            return column.astype(np.int32)
+    return column
 
 
 def extract_split_cut_sets(split_cuts):
@@ -129,7 +268,7 @@ def extract_split_cut_sets(split_cuts):
     split_cuts_sets: list of str
     Each item in the list contain the set of splits in a given variable
     """
-    return re.split(r"[ \t]*;[ \t]*", split_cuts)
+    return SPLIT_CUT_SETS_SEPARATOR.split(split_cuts)
 
 
 def format_split_on(split_on):
@@ -145,7 +284,7 @@ def format_split_on(split_on):
     formatted_split_on: list of str
     A list of uppercase column names
     """
-    return [item.upper() for item in re.split(r"[, ;]+", split_on)]
+    return [item.upper() for item in SPLIT_ON_SEPARATOR.split(split_on)]
 
 
 def format_splits(split_cuts_sets):
@@ -165,18 +304,36 @@ def format_splits(split_cuts_sets):
     The lower (upper) limit of the interval is included in(excluded of) the interval
     Values outside these intervals will be assinged a -1
     """
+    # remove the brackets from the whole set before splitting it, and let
+    # numpy parse all the cuts of the set at once
     splits = [
-        np.array([
-            float(re.sub(r"[\[\]]*", "", cut))
-            for cut in re.split(r"[ \t]*[, ]+[ \t]*", item)
-        ],
-                 dtype=float)
-        for item in split_cuts_sets
+        np.array(SPLIT_CUTS_SEPARATOR.split(
+            item.translate(BRACKETS_TABLE).strip()),
+                 dtype=float) for item in split_cuts_sets
     ]
     return splits
 
 
-@njit
+def group_number_dtype(num_groups):
+    """Find the smallest signed integer type able to store the group numbers
+
+    Arguments
+    ---------
+    num_groups: int
+    Number of groups
+
+    Return
+    ------
+    dtype: np.dtype
+    The smallest signed integer type able to store all the group numbers
+    (from 0 to num_groups - 1) and the -1 used to flag entries without a group
+    """
+    # group numbers range from -1 to num_groups - 1, so they fit in the
+    # smallest type able to hold -num_groups
+    return np.min_scalar_type(-max(num_groups, 1))
+
+
+@njit(cache=True)
 def retreive_group_number(specid, specid_list, groups_list):
     """Retreive the groups a specid belongs to
 
@@ -186,7 +343,8 @@ def retreive_group_number(specid, specid_list, groups_list):
     The specid
 
     specid_list: array of int
-    The list of specids in the catalogue
+    The list of specids in the catalogue. Must be sorted (see function
+    sort_specids)
 
     groups_list: array of int
     The group number associated to each specid
@@ -194,8 +352,88 @@ def retreive_group_number(specid, specid_list, groups_list):
     Return
     ------
     group_number: int
-    The group number associated with the specified specid
+    The group number associated with the specified specid. -1 if the specid
+    is not in the catalogue
     """
-    pos = np.where(specid_list == specid)
-
+    pos = np.searchsorted(specid_list, specid)
+    if pos == specid_list.size or specid_list[pos] != specid:
+        return -1
     return groups_list[pos]
+
+
+def retreive_group_numbers(specids, specid_list, groups_list):
+    """Retreive the groups a set of specids belong to. This is the vectorized
+    version of retreive_group_number
+
+    Arguments
+    ---------
+    specids: array of int
+    The specids
+
+    specid_list: array of int
+    The list of specids in the catalogue. Must be sorted (see function
+    sort_specids)
+
+    groups_list: array of int
+    The group number associated to each specid
+
+    Return
+    ------
+    group_numbers: array of int
+    The group number associated with each of the specified specids. -1 for
+    specids not in the catalogue
+    """
+    if specid_list.size == 0:
+        return np.full(specids.size, -1, dtype=np.int64)
+    pos = np.searchsorted(specid_list, specids)
+    pos[pos == specid_list.size] = 0
+    return np.where(specid_list[pos] == specids, groups_list[pos], -1)
+
+
+def sort_specids(specid_list, groups_list):
+    """Sort the catalogue specids (and their associated group numbers) so that
+    they can be searched by retreive_group_number
+
+    Arguments
+    ---------
+    specid_list: array of int
+    The list of specids in the catalogue
+
+    groups_list: array of int
+    The group number associated to each specid
+
+    Return
+    ------
+    sorted_specid_list: array of int
+    The sorted list of specids
+
+    sorted_groups_list: array of int
+    The group number associated to each of the sorted specids
+    """
+    order = np.argsort(specid_list, kind="stable")
+    return specid_list[order], groups_list[order]
+
+
+def stack_group(group_number):
+    """Stack the spectra of a group. Used to stack the different groups
+    in parallel
+
+    The stacker and spectra of the group are read from GROUPS_TO_STACK,
+    which the worker processes inherit from the parent when forked
+
+    Arguments
+    ---------
+    group_number: int
+    The group to stack
+
+    Return
+    ------
+    stacked_flux: array of float
+    The stacked flux
+
+    stacked_weight: array of float
+    The sum of weights associated with each flux
+    """
+    stacker, spectra = GROUPS_TO_STACK[group_number]
+    stacker.stack(spectra)
+    return stacker.stacked_flux, stacker.stacked_weight
@@ -1,4 +1,6 @@
 """ This file contains the interface to use the package"""
+from contextlib import contextmanager
+from functools import partial
 import logging
 import multiprocessing
 import time
@@ -9,13 +11,62 @@ from stacking.rebin import Rebin
 from stacking.spectrum import Spectrum
 
 
+def apply_indexed(function, indexed_item):
+    """Apply a function to an item keeping track of the item's position. Used
+    to collect the results of unordered parallel maps
+
+    Arguments
+    ---------
+    function: callable
+    The function to apply
+
+    indexed_item: (int, object)
+    The position of the item and the item
+
+    Return
+    ------
+    index: int
+    The position of the item
+
+    result: object
+    The result of applying the function to the item
+    """
+    index, item = indexed_item
+    return index, function(item)
+
+
+@contextmanager
+def log_time_spent(log_function, label):
+    """Log the time spent running the enclosed block
+
+    Arguments
+    ---------
+    log_function: callable
+    The logging function (e.g. logger.info)
+
+    label: str
+    Description of the enclosed block. The logged message is
+    "Time spent {label}: {time} seconds". The time is also logged if the
+    block raises an exception
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        log_function("Time spent %s: %f seconds", label,
+                     time.perf_counter() - start_time)
+
+
 class StackingInterface:
     """Interface for the stacking Package
 
     Methods
     -------
     __init__
+    close_pool
+    get_pool
     load_config
+    map_spectra
     read_data
 
     Attributes
@@ -29,6 +80,10 @@ class StackingInterface:
     num_processors: int
     Number of processors to use in parallelization
 
+    pool: multiprocessing.Pool or None
+    Pool of worker processes used to normalize the spectra. None unless the
+    normalization is running
+
     spectra: list of Spectrum
     List of spectra to stack
 
@@ -44,6 +99,7 @@ class StackingInterface:
         self.logger = logging.getLogger(__name__)
         self.config = None
         self.num_processors = None
+        self.pool = None
         self.spectra = None
         self.stacker = None
         self.rebin = None
@@ -55,6 +111,27 @@ class StackingInterface:
         self.stack_spectra_flag = None
         self.write_results_flag = None
 
+    def close_pool(self):
+        """Close the pool of worker processes (if any)"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def get_pool(self):
+        """Get the pool of worker processes. The pool is created the first time
+        it is required and kept until close_pool is called
+
+        Return
+        ------
+        pool: multiprocessing.Pool
+        The pool of worker processes
+        """
+        if self.pool is None:
+            context = multiprocessing.get_context('fork')
+            self.pool = context.Pool(processes=self.num_processors)
+        return self.pool
+
     def load_config(self, config_file):
         """Load the configuration of the run, sets up the print function
         that will be used to print, initializes the saving folders and the
@@ -76,104 +153,94 @@ class StackingInterface:
         # done here to detect early errors
         self.rebin = Rebin(self.config.rebin_args)
 
+    def map_spectra(self, function):
+        """Apply a function to all the spectra, replacing each spectrum by the
+        result. Runs in parallel if more than one processor is used
+
+        Arguments
+        ---------
+        function: callable
+        The function to apply. It must take a Spectrum and return a Spectrum
+        """
+        if self.num_processors > 1:
+            # Pick a large chunk size such that the function is copied as few
+            # times as possible
+            chunksize = int(len(self.spectra) / self.num_processors / 3)
+            chunksize = max(1, chunksize)
+            # collect the results as they are ready, replacing the original
+            # spectra so that both versions are not kept in memory
+            indexed_function = partial(apply_indexed, function)
+            results = self.get_pool().imap_unordered(indexed_function,
+                                                     enumerate(self.spectra),
+                                                     chunksize=chunksize)
+            for index, spectrum in results:
+                self.spectra[index] = spectrum
+        else:
+            self.spectra = [function(spectrum) for spectrum in self.spectra]
+
     def normalize_spectra(self):
         """ Normalize spectra """
         if self.normalize_spectra_flag:
-            start_time = time.time()
-            self.logger.info("Starting normalization procedure")
-
-            normalizer_type, normalizer_arguments = self.config.normalizer
-            normalizer = normalizer_type(normalizer_arguments)
-
-            # compute normalization factors
-            start_time_step = time.time()
-            self.logger.progress("Computing normalization factors")
-            normalizer.compute_norm_factors(self.spectra)
-            end_time_step = time.time()
-            self.logger.progress(
-                "Time spent computing normalisation factors: %f seconds",
-                end_time_step - start_time_step)
-
-            # save normalisation factor
-            start_time_step = time.time()
-            self.logger.progress("Saving normalization factors")
-            normalizer.save_norm_factors()
-            end_time_step = time.time()
-            self.logger.progress(
-                "Time spent saving normalisation factors: %f seconds",
-                end_time_step - start_time_step)
-
-            # normalize spectra
-            start_time_step = time.time()
-            self.logger.progress("Normalizing")
-            if self.num_processors > 1:
-                context = multiprocessing.get_context('fork')
-                with context.Pool(processes=self.num_processors) as pool:
-                    self.spectra = pool.map(normalizer.normalize, self.spectra)
-            else:
-                self.spectra = [
-                    normalizer.normalize_spectrum(spectrum)
-                    for spectrum in self.spectra
-                ]
-            end_time_step = time.time()
-            self.logger.progress("Time spent normalizing: %f seconds",
-                                 end_time_step - start_time_step)
-
-            end_time = time.time()
-            self.logger.info(
-                "Time spent in the normalization procedure: %f seconds",
-                end_time - start_time)
+            with log_time_spent(self.logger.info,
+                                "in the normalization procedure"):
+                self.logger.info("Starting normalization procedure")
+
+                normalizer_type, normalizer_arguments = self.config.normalizer
+                normalizer = normalizer_type(normalizer_arguments)
+
+                # compute normalization factors
+                with log_time_spent(self.logger.progress,
+                                    "computing normalisation factors"):
+                    self.logger.progress("Computing normalization factors")
+                    normalizer.compute_norm_factors(self.spectra)
+
+                # save normalisation factor
+                with log_time_spent(self.logger.progress,
+                                    "saving normalisation factors"):
+                    self.logger.progress("Saving normalization factors")
+                    normalizer.save_norm_factors()
+
+                # normalize spectra
+                with log_time_spent(self.logger.progress, "normalizing"):
+                    self.logger.progress("Normalizing")
+                    # the normalization is the only step using the pool, so
+                    # the workers are not kept alive for the rest of the run
+                    try:
+                        self.map_spectra(normalizer.normalize_spectrum)
+                    finally:
+                        self.close_pool()
 
     def read_data(self):
         """Load spectra to stack. Use the reader specified in the configuration"""
         if self.read_data_flag:
-            start_time = time.time()
-            self.logger.info("Reading data")
-
-            reader_type, reader_arguments = self.config.reader
-            reader = reader_type(reader_arguments)
-            self.spectra = reader.read_data()
-
-            # we should never enter this block unless ReaderType is not correctly
-            # writen
-            if not all((isinstance(spectrum, Spectrum)
-                        for spectrum in self.spectra)):  # pragma: no cover
-                raise StackingError(
-                    "Error reading data.\n At least one of the elements in variable "
-                    "'spectra' is not of class Spectrum. This can happen if the "
-                    "Reader object responsible for reading the data did not define "
-                    "the correct data type. Please check for correct inheritance "
-                    "pattern.")
-
-            end_time = time.time()
-            self.logger.info("Time spent reading data: %f seconds",
-                             end_time - start_time)
+            with log_time_spent(self.logger.info, "reading data"):
+                self.logger.info("Reading data")
+
+                reader_type, reader_arguments = self.config.reader
+                reader = reader_type(reader_arguments)
+                self.spectra = reader.read_data()
+
+                # we should never enter this block unless ReaderType is not
+                # correctly writen
+                if not all((isinstance(spectrum, Spectrum)
+                            for spectrum in self.spectra)):  # pragma: no cover
+                    raise StackingError(
+                        "Error reading data.\n At least one of the elements in variable "
+                        "'spectra' is not of class Spectrum. This can happen if the "
+                        "Reader object responsible for reading the data did not define "
+                        "the correct data type. Please check for correct inheritance "
+                        "pattern.")
 
     def rebin_data(self):
         """Rebin data to a common grid"""
         if self.rebin_data_flag:
-            start_time = time.time()
-
-            self.logger.info("Rebinning data")
-
-            # do the actual rebinning
-            if self.num_processors > 1:
-                context = multiprocessing.get_context('fork')
-                # Pick a large chunk size such that rebin is copied as few times
-                # as possible
-                chunksize = int(len(self.spectra) / self.num_processors / 3)
-                chunksize = max(1, chunksize)
-                with context.Pool(processes=self.num_processors) as pool:
-                    self.spectra = list(
-                        pool.map(self.rebin, self.spectra, chunksize=chunksize))
-            else:
-                self.spectra = [
-                    self.rebin(spectrum) for spectrum in self.spectra
-                ]
-
-            end_time = time.time()
-            self.logger.info("Time spent rebinning data: %f seconds",
-                             end_time - start_time)
+            with log_time_spent(self.logger.info, "rebinning data"):
+                self.logger.info("Rebinning data")
+
+                # do the actual rebinning
+                # rebinning is done in batches within this process: this is
+                # faster than sending the spectra back and forth to a pool
+                self.rebin.rebin_spectra(self.spectra)
 
     def setup_run(self):
         """Setup the current run"""
@@ -211,29 +278,20 @@ class StackingInterface:
     def stack_spectra(self):
         """ Stack spectra """
         if self.stack_spectra_flag:
-            start_time = time.time()
+            with log_time_spent(self.logger.info, "stacking data"):
+                self.logger.info("Initilalizing stacker")
+                stacker_type, stacker_arguments = self.config.stacker
+                self.stacker = stacker_type(stacker_arguments)
 
-            self.logger.info("Initilalizing stacker")
-            stacker_type, stacker_arguments = self.config.stacker
-            self.stacker = stacker_type(stacker_arguments)
-
-            self.logger.info("Stacking data")
-            self.stacker.stack(self.spectra)
-
-            end_time = time.time()
-            self.logger.info("Time spent stacking data: %f seconds",
-                             end_time - start_time)
+                self.logger.info("Stacking data")
+                self.stacker.stack(self.spectra)
 
     def write_results(self):
         """ Write results to disc"""
         if self.write_results_flag:
-            start_time = time.time()
-            self.logger.info("Writing results")
-
-            writer_type, writer_arguments = self.config.writer
-            writer = writer_type(writer_arguments)
-            writer.write_results(self.stacker)
+            with log_time_spent(self.logger.info, "writing results"):
+                self.logger.info("Writing results")
 
-            end_time = time.time()
-            self.logger.info("Time spent writing results: %f seconds",
-                             end_time - start_time)
+                writer_type, writer_arguments = self.config.writer
+                writer = writer_type(writer_arguments)
+                writer.write_results(self.stacker)
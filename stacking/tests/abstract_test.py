@@ -1,5 +1,8 @@
 """This file contains an abstract class to define functions common to all tests"""
 from configparser import ConfigParser
+import filecmp
+from itertools import zip_longest
+import math
 import os
 import re
 import unittest
@@ -14,6 +17,16 @@ from stacking.tests.utils import COMMON_WAVELENGTH_GRID
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# system dependent bits of the paths to the test files
+TEST_PATH_REGEX = re.compile(r"\/[^ ]*\/stacking\/tests\/")
+
+# table columns containing IDs, compared without tolerance by
+# AbstractTest.compare_fits_data
+ID_COLUMNS = frozenset(["LOS_ID", "TARGETID", "THING_ID"])
+
+# header keys whose values are not compared by AbstractTest.compare_fits_headers
+UNCOMPARED_HEADER_KEYS = ["CHECKSUM", "DATASUM", "DATETIME", "VERSION"]
+
 
 class AbstractTest(unittest.TestCase):
     """Abstract test class to define functions used in all tests
@@ -23,20 +36,24 @@ class AbstractTest(unittest.TestCase):
     (check unittest.TestCase)
     compare_ascii
     compare_fits
+    setUpClass
     setUp
     """
 
-    def setUp(self):
-        """ Actions done at test startup
+    @classmethod
+    def setUpClass(cls):
+        """ Actions done once before the tests in the class are run
         - Check that the results folder exists and create it
         if it does not.
-        - Setup logger
-        - Ensure Spectrum.common_wavelength_grid is defined
         """
         # setup results folder
-        if not os.path.exists(f"{THIS_DIR}/results/"):
-            os.makedirs(f"{THIS_DIR}/results/")
+        os.makedirs(f"{THIS_DIR}/results/", exist_ok=True)
 
+    def setUp(self):
+        """ Actions done at test startup
+        - Setup logger
+        - Ensure Spectrum.common_wavelength_grid is defined
+        """
         # setup logger
         setup_logger(logging_level_console="PROGRESS")
 
@@ -80,18 +97,20 @@ class AbstractTest(unittest.TestCase):
         elif not isinstance(parent_classes, list):
             parent_classes = [parent_classes]
 
+        # the error can be raised by the class or by any of its parents
+        class_names = [test_class.__name__] + [
+            parent_class.__name__ for parent_class in parent_classes
+        ]
+
         config = ConfigParser()
         config.read_dict({"test": {}})
 
         for option, value in options_and_values:
             # check that the error is raised
             expected_messages = [
-                f"Missing argument '{option}' required by {test_class.__name__}"
+                f"Missing argument '{option}' required by {class_name}"
+                for class_name in class_names
             ]
-            for parent_class in parent_classes:
-                expected_messages.append(
-                    f"Missing argument '{option}' required by {parent_class.__name__}"
-                )
             with self.assertRaises(error_type) as context_manager:
                 test_class(config["test"])
 
@@ -124,18 +143,25 @@ class AbstractTest(unittest.TestCase):
         If set to true, replace the instances of the string 'THIS_DIR' by
         its value
         """
+        # byte-identical files are equal
+        if filecmp.cmp(orig_file, new_file, shallow=False):
+            return
+
         with open(orig_file, 'r',
                   encoding="utf-8") as orig, open(new_file,
                                                   'r',
                                                   encoding="utf-8") as new:
-            for orig_line, new_line in zip(orig.readlines(), new.readlines()):
+            # iterate over the files lazily instead of reading them in full.
+            # Missing lines in the shortest file are compared as empty lines
+            for orig_line, new_line in zip_longest(orig, new, fillvalue=""):
+                if orig_line == new_line:
+                    continue
+
                 # this is necessary to remove the system dependent bits of
                 # the paths
-                if "py/picca/tests/delta_extraction" in orig_line:
-                    orig_line = re.sub(r"\/[^ ]*\/stacking\/tests\/", "",
-                                       orig_line)
-                    new_line = re.sub(r"\/[^ ]*\/stacking\/tests\/", "",
-                                      new_line)
+                if "stacking/tests/" in orig_line or "stacking/tests/" in new_line:
+                    orig_line = TEST_PATH_REGEX.sub("", orig_line)
+                    new_line = TEST_PATH_REGEX.sub("", new_line)
 
                 if not orig_line == new_line:
                     report_mismatch(orig_file, new_file)
@@ -157,8 +183,8 @@ class AbstractTest(unittest.TestCase):
         new_file: str
         New file
         """
-        orig_df = pd.read_csv(orig_file, delim_whitespace=True)
-        new_df = pd.read_csv(orig_file, delim_whitespace=True)
+        orig_df = pd.read_csv(orig_file, sep=r"\s+")
+        new_df = pd.read_csv(new_file, sep=r"\s+")
 
         self.compare_df(orig_df, new_df, orig_file=orig_file, new_file=new_file)
 
@@ -211,11 +237,8 @@ class AbstractTest(unittest.TestCase):
                 else:
                     report_mismatch(orig_file, new_file)
                 print(f"Different data found for column '{col}'")
-                print("orig new is_close orig-new\n")
-                for item1, item2 in zip(orig_df[col], new_df[col]):
-                    print(f"{item1} {item2} "
-                          f"{np.isclose(item1, item2, equal_nan=True)} "
-                          f"{item1 - item2}\n")
+                print_mismatched_rows(orig_df[col].to_numpy(),
+                                      new_df[col].to_numpy())
                 self.fail("DataFrame: data mismatch")
 
     def compare_error_message(self,
@@ -243,14 +266,13 @@ class AbstractTest(unittest.TestCase):
         # remove system dependent bits of the expected messages
         for index, expected_message in enumerate(expected_messages):
             if "stacking/tests/" in expected_message:
-                expected_messages[index] = re.sub(r"\/[^ ]*\/stacking\/tests\/",
-                                                  "", expected_message)
+                expected_messages[index] = TEST_PATH_REGEX.sub(
+                    "", expected_message)
 
         # remove system dependent bits of the received message
         received_message = str(context_manager.exception)
         if "stacking/tests/" in received_message:
-            received_message = re.sub(r"\/[^ ]*\/stacking\/tests\/", "",
-                                      received_message)
+            received_message = TEST_PATH_REGEX.sub("", received_message)
 
         if startswith:
             if not any(
@@ -318,31 +340,52 @@ class AbstractTest(unittest.TestCase):
         New file
         """
         # open fits files
-        orig_hdul = fits.open(orig_file)
-        new_hdul = fits.open(new_file)
+        # byte-identical files are equal
+        if filecmp.cmp(orig_file, new_file, shallow=False):
+            return
+
+        # HDUs are only parsed (and their data only read) when they are
+        # accessed
+        open_kwargs = {
+            "memmap": True,
+            "lazy_load_hdus": True,
+            "do_not_scale_image_data": True,
+            "cache": False,
+        }
+        orig_hdul = fits.open(orig_file, **open_kwargs)
+        new_hdul = fits.open(new_file, **open_kwargs)
         try:
             # compare them
             if not len(orig_hdul) == len(new_hdul):
-                self.report_fits_mismatch_hdul(orig_file, new_file, orig_hdul,
-                                               new_hdul)
-
-            # loop over HDUs
-            for hdu_index, hdu in enumerate(orig_hdul):
-                if "EXTNAME" in hdu.header:
-                    hdu_name = hdu.header["EXTNAME"]
-                else:
-                    hdu_name = hdu_index
+                self.fail(
+                    self.report_fits_mismatch_hdul(orig_file, new_file,
+                                                   orig_hdul, new_hdul))
+
+            # loop over HDUs, collecting all the mismatches so that they
+            # are reported together
+            errors = []
+            for hdu_index, orig_hdu in enumerate(orig_hdul):
+                # HDUs are paired by position when the names agree, so that
+                # files with repeated HDU names (e.g. several spectra with
+                # the same specid) are compared correctly
+                hdu_name = orig_hdu.header.get("EXTNAME", hdu_index)
+                new_hdu = new_hdul[hdu_index]
+                if new_hdu.header.get("EXTNAME", hdu_index) != hdu_name:
+                    new_hdu = new_hdul[hdu_name]
                 # check header
-                self.compare_fits_headers(orig_file, new_file,
-                                          orig_hdul[hdu_name].header,
-                                          new_hdul[hdu_name].header)
+                errors += self.compare_fits_headers(orig_file, new_file,
+                                                    orig_hdu.header,
+                                                    new_hdu.header)
                 # check data
-                self.compare_fits_data(orig_file, new_file, orig_hdul[hdu_name],
-                                       new_hdul[hdu_name])
+                errors += self.compare_fits_data(orig_file, new_file, orig_hdu,
+                                                 new_hdu)
         finally:
             orig_hdul.close()
             new_hdul.close()
 
+        if errors:
+            self.fail("\n".join(errors))
+
     def compare_fits_data(self, orig_file, new_file, orig_hdu, new_hdu):
         """Compare the data of two HDUs
 
@@ -359,62 +402,77 @@ class AbstractTest(unittest.TestCase):
 
         new_hdu: fits.hdu.table.BinTableHDU or fits.hdu.image.ImageHDU
         New header
+
+        Return
+        ------
+        errors: list of str
+        The mismatches found. Empty if the data are equal
         """
-        orig_data = orig_hdu.data
-        new_data = new_hdu.data
+        hdu_name = orig_hdu.header.get("EXTNAME")
+        errors = []
 
-        # Empty HDU
-        if orig_data is None:
-            if new_data is not None:
-                self.report_fits_mismatch_data(orig_file, new_file, orig_data,
-                                               new_data,
-                                               orig_hdu.header["EXTNAME"])
+        # Empty HDU (checked from the header, without loading the data)
+        if orig_hdu.header.get("NAXIS", 0) == 0:
+            if new_hdu.header.get("NAXIS", 0) != 0:
+                errors.append(
+                    self.report_fits_mismatch_data(orig_file, new_file, None,
+                                                   new_hdu.data, hdu_name))
 
         # Image HDU
-        elif orig_data.dtype.names is None:
-            if not np.allclose(orig_data, new_data, equal_nan=True):
-                self.report_fits_mismatch_data(orig_file, new_file, orig_data,
-                                               new_data,
-                                               orig_hdu.header["EXTNAME"])
+        elif not isinstance(orig_hdu, (fits.BinTableHDU, fits.TableHDU)):
+            # compare shapes first, otherwise np.allclose would broadcast
+            # arrays with different shapes
+            if (isinstance(new_hdu, (fits.BinTableHDU, fits.TableHDU)) or
+                    orig_hdu.shape != new_hdu.shape or
+                    not images_close(orig_hdu.data, new_hdu.data)):
+                errors.append(
+                    self.report_fits_mismatch_data(orig_file, new_file,
+                                                   orig_hdu.data, new_hdu.data,
+                                                   hdu_name))
 
         # Table HDU
         else:
+            orig_data = orig_hdu.data
+            new_data = new_hdu.data
             for col in orig_data.dtype.names:
                 if not col in new_data.dtype.names:
-                    self.report_fits_mismatch_data(orig_file,
-                                                   new_file,
-                                                   orig_data,
-                                                   new_data,
-                                                   orig_hdu.header["EXTNAME"],
-                                                   col=col,
-                                                   missing_col="new")
-                self.assertTrue(col in new_data.dtype.names)
+                    errors.append(
+                        self.report_fits_mismatch_data(orig_file,
+                                                       new_file,
+                                                       orig_data,
+                                                       new_data,
+                                                       hdu_name,
+                                                       col=col,
+                                                       missing_col="new"))
+                    continue
                 # This is passed to np.allclose and np.isclose to properly handle IDs
-                if col in ['LOS_ID', 'TARGETID', 'THING_ID']:
+                if col in ID_COLUMNS:
                     rtol = 0
                 # This is the default numpy rtol value
                 else:
                     rtol = 1e-5
 
-                if (np.all(orig_data[col] != new_data[col]) and not np.allclose(
-                        orig_data[col], new_data[col], equal_nan=True,
-                        rtol=rtol)):
-                    self.report_fits_mismatch_data(orig_file,
-                                                   new_file,
-                                                   orig_data,
-                                                   new_data,
-                                                   orig_hdu.header["EXTNAME"],
-                                                   col=col,
-                                                   rtol=rtol)
+                if not columns_equal(orig_data[col], new_data[col], rtol):
+                    errors.append(
+                        self.report_fits_mismatch_data(orig_file,
+                                                       new_file,
+                                                       orig_data,
+                                                       new_data,
+                                                       hdu_name,
+                                                       col=col,
+                                                       rtol=rtol))
             for col in new_data.dtype.names:
                 if col not in orig_data.dtype.names:
-                    self.report_fits_mismatch_data(orig_file,
-                                                   new_file,
-                                                   orig_data,
-                                                   new_data,
-                                                   orig_hdu.header["EXTNAME"],
-                                                   col=col,
-                                                   missing_col="orig")
+                    errors.append(
+                        self.report_fits_mismatch_data(orig_file,
+                                                       new_file,
+                                                       orig_data,
+                                                       new_data,
+                                                       hdu_name,
+                                                       col=col,
+                                                       missing_col="orig"))
+
+        return errors
 
     def compare_fits_headers(self, orig_file, new_file, orig_header,
                              new_header):
@@ -433,38 +491,60 @@ class AbstractTest(unittest.TestCase):
 
         new_header: fits.header.Header
         New header
-        """
-        for key in orig_header:
-            if key not in new_header:
-                self.report_fits_mismatch_header(orig_file,
-                                                 new_file,
-                                                 orig_header,
-                                                 new_header,
-                                                 key,
-                                                 missing_key="new")
-            if key in ["CHECKSUM", "DATASUM", "DATETIME", "VERSION"]:
-                continue
-            if (orig_header[key] != new_header[key] and
-                (isinstance(orig_header[key], str) or key == "COMMENT" or
-                 not np.isclose(orig_header[key], new_header[key]))):
 
-                self.report_fits_mismatch_header(orig_file, new_file,
-                                                 orig_header, new_header, key)
-            if orig_header.comments[key] != new_header.comments[key]:
+        Return
+        ------
+        errors: list of str
+        The mismatches found. Empty if the headers are equal
+        """
+        # fast path: the headers are identical (other than the keys whose
+        # values are allowed to change)
+        if header_string(orig_header,
+                         new_header) == header_string(new_header, orig_header):
+            return []
+
+        # check that both headers have the same keys
+        errors = []
+        orig_keys = set(orig_header.keys())
+        new_keys = set(new_header.keys())
+        for key in orig_keys - new_keys:
+            errors.append(
                 self.report_fits_mismatch_header(orig_file,
                                                  new_file,
                                                  orig_header,
                                                  new_header,
                                                  key,
-                                                 comments=True)
-        for key in new_header:
-            if key not in orig_header:
+                                                 missing_key="new"))
+        for key in new_keys - orig_keys:
+            errors.append(
                 self.report_fits_mismatch_header(orig_file,
                                                  new_file,
                                                  orig_header,
                                                  new_header,
                                                  key,
-                                                 missing_key="orig")
+                                                 missing_key="orig"))
+
+        for key in orig_header:
+            if key in UNCOMPARED_HEADER_KEYS or key not in new_keys:
+                continue
+            if (orig_header[key] != new_header[key] and
+                (key == "COMMENT" or
+                 not header_values_equal(orig_header[key], new_header[key]))):
+
+                errors.append(
+                    self.report_fits_mismatch_header(orig_file, new_file,
+                                                     orig_header, new_header,
+                                                     key))
+            if orig_header.comments[key] != new_header.comments[key]:
+                errors.append(
+                    self.report_fits_mismatch_header(orig_file,
+                                                     new_file,
+                                                     orig_header,
+                                                     new_header,
+                                                     key,
+                                                     comments=True))
+
+        return errors
 
     def fail(self, msg=None):
         """Overwrite the self.fail() function to print the hightligh first
@@ -516,6 +596,11 @@ class AbstractTest(unittest.TestCase):
         rtol: float - Default: 1e-5
         Relative tolerance parameter (see documentation for
         numpy.islcose or np.allclose)
+
+        Return
+        ------
+        message: str
+        A short description of the mismatch
         """
         report_mismatch(orig_file, new_file)
 
@@ -524,27 +609,21 @@ class AbstractTest(unittest.TestCase):
                 print("Data found in new HDU but not in orig HDU")
             else:
                 print(f"Different values found for HDU {hdu_name}")
-                print("original new isclose original-new\n")
-                for new, orig in zip(orig_data, new_data):
-                    print(f"{orig} {new} "
-                          f"{np.isclose(orig, new, equal_nan=True)} "
-                          f"{orig-new}")
+                print_mismatched_rows(orig_data, new_data)
 
         else:
             if missing_col is None:
                 print(f"Different values found for column {col} in "
                       f"HDU {hdu_name}")
-                print("original new isclose original-new\n")
-                for new, orig in zip(new_data[col], orig_data[col]):
-                    print(f"{orig} {new} "
-                          f"{np.isclose(orig, new, equal_nan=True, rtol=rtol)} "
-                          f"{orig-new}")
+                print_mismatched_rows(orig_data[col], new_data[col], rtol=rtol)
             else:
                 print(
                     f"Column {col} in HDU {hdu_name} missing in {missing_col} file"
                 )
 
-        self.fail("Fits file: data mismatch")
+        if col is None:
+            return f"Fits file: data mismatch in HDU {hdu_name}"
+        return f"Fits file: data mismatch in column {col} of HDU {hdu_name}"
 
     def report_fits_mismatch_header(self,
                                     orig_file,
@@ -580,6 +659,11 @@ class AbstractTest(unittest.TestCase):
         comments: bool - Default: False
         True if the problem is with the header comment related to this key
         False if the problem is with the header value related to this key
+
+        Return
+        ------
+        message: str
+        A short description of the mismatch
         """
         report_mismatch(orig_file, new_file)
 
@@ -599,7 +683,7 @@ class AbstractTest(unittest.TestCase):
         else:
             print(f"key {key} missing in {missing_key} header")
 
-        self.fail("Fits file: header mismatch")
+        return f"Fits file: header mismatch for key {key}"
 
     def report_fits_mismatch_hdul(self, orig_file, new_file, orig_hdul,
                                   new_hdul):
@@ -619,6 +703,11 @@ class AbstractTest(unittest.TestCase):
 
         new_hdul: fits.hdu.hdulist.HDUList
         New HDU list
+
+        Return
+        ------
+        message: str
+        A short description of the mismatch
         """
         report_mismatch(orig_file, new_file)
 
@@ -628,7 +717,174 @@ class AbstractTest(unittest.TestCase):
         print("new_hdul.info():")
         new_hdul.info()
 
-        self.fail("Fits file: HDUList mismatch")
+        return "Fits file: HDUList mismatch"
+
+
+def columns_equal(orig_column, new_column, rtol):
+    """Check whether two data columns are equal. Columns are first compared
+    for exact equality and only compared within tolerance if they differ
+
+    Arguments
+    ---------
+    orig_column: array
+    Control column
+
+    new_column: array
+    New column
+
+    rtol: float
+    Relative tolerance parameter (see documentation for numpy.allclose)
+
+    Return
+    ------
+    equal: bool
+    True if the columns are equal, False otherwise
+    """
+    # fast path: exact match, short-circuits at the first difference
+    if orig_column.dtype.kind in "biufc":
+        if np.array_equal(orig_column, new_column, equal_nan=True):
+            return True
+    elif np.array_equal(orig_column, new_column):
+        return True
+
+    # no tolerance applies to integer columns (e.g. IDs) or to non-numeric
+    # columns, so skip np.allclose and its upcast to float
+    if orig_column.dtype.kind in "iu" and new_column.dtype.kind in "iu":
+        return False
+    if (orig_column.dtype.kind not in "biufc" or
+            new_column.dtype.kind not in "biufc"):
+        return False
+
+    return np.allclose(orig_column, new_column, equal_nan=True, rtol=rtol)
+
+
+def header_values_equal(orig_value, new_value):
+    """Check whether two header values are equal. Numeric values are compared
+    within tolerance
+
+    Arguments
+    ---------
+    orig_value: str, int, float or bool
+    Control value
+
+    new_value: str, int, float or bool
+    New value
+
+    Return
+    ------
+    equal: bool
+    True if the values are equal, False otherwise
+    """
+    if isinstance(orig_value, str) or isinstance(new_value, str):
+        return orig_value == new_value
+    # math.isclose is much faster than np.isclose on scalars
+    try:
+        return math.isclose(orig_value, new_value, rel_tol=1e-5, abs_tol=1e-8)
+    except TypeError:
+        return orig_value == new_value
+
+
+def images_close(orig_image, new_image, rtol=1e-5, chunk_size=2**17):
+    """Check whether two images of the same shape are equal within
+    tolerance. The images are compared in chunks, so that the temporary
+    arrays stay small and the comparison stops at the first differing chunk
+
+    Arguments
+    ---------
+    orig_image: array
+    Control image
+
+    new_image: array
+    New image. Must have the same shape as orig_image
+
+    rtol: float - Default: 1e-5
+    Relative tolerance parameter (see documentation for numpy.allclose)
+
+    chunk_size: int - Default: 2**17
+    Number of pixels compared at a time
+
+    Return
+    ------
+    close: bool
+    True if the images are equal within tolerance, False otherwise
+    """
+    orig_image = orig_image.reshape(-1)
+    new_image = new_image.reshape(-1)
+    for start in range(0, orig_image.size, chunk_size):
+        orig_chunk = orig_image[start:start + chunk_size]
+        new_chunk = new_image[start:start + chunk_size]
+        if not (np.array_equal(orig_chunk, new_chunk, equal_nan=True) or
+                np.allclose(orig_chunk, new_chunk, equal_nan=True, rtol=rtol)):
+            return False
+    return True
+
+
+def header_string(header, other_header):
+    """Serialize a header, removing the keys whose values are not compared
+    by AbstractTest.compare_fits_headers
+
+    Arguments
+    ---------
+    header: fits.header.Header
+    The header to serialize
+
+    other_header: fits.header.Header
+    The header it will be compared to. Keys not compared are only removed if
+    they are present in both headers
+
+    Return
+    ------
+    string: str
+    The serialized header
+    """
+    keys = [
+        key for key in UNCOMPARED_HEADER_KEYS
+        if key in header and key in other_header
+    ]
+    if keys:
+        header = header.copy()
+        for key in keys:
+            del header[key]
+    return header.tostring()
+
+
+def print_mismatched_rows(orig_array, new_array, rtol=1e-5, max_rows=20):
+    """Print the first mismatching elements of two arrays
+
+    Arguments
+    ---------
+    orig_array: array
+    Control array
+
+    new_array: array
+    New array
+
+    rtol: float - Default: 1e-5
+    Relative tolerance parameter (see documentation for numpy.isclose)
+
+    max_rows: int - Default: 20
+    Maximum number of mismatching elements to print
+    """
+    orig_array = np.ravel(orig_array)
+    new_array = np.ravel(new_array)
+    if orig_array.shape != new_array.shape:
+        print(f"Different sizes found: original {orig_array.size}, "
+              f"new {new_array.size}")
+        return
+
+    numeric = orig_array.dtype.kind in "biufc" and new_array.dtype.kind in "biufc"
+    if numeric:
+        mismatch = ~np.isclose(orig_array, new_array, equal_nan=True, rtol=rtol)
+    else:
+        mismatch = orig_array != new_array
+    indexs = np.flatnonzero(mismatch)
+
+    print(f"{indexs.size} of {orig_array.size} elements differ. Showing the "
+          f"first {min(indexs.size, max_rows)}")
+    print("index original new original-new\n")
+    for index in indexs[:max_rows]:
+        orig, new = orig_array[index], new_array[index]
+        print(f"{index} {orig} {new} {orig - new if numeric else ''}")
 
 
 def report_mismatch(orig_file, new_file):
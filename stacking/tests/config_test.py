@@ -70,20 +70,24 @@ class ConfigTest(AbstractTest):
         orig_config.read(orig_file)
         new_config = ConfigParser()
         new_config.read(new_file)
+        orig_sections = set(orig_config.sections())
+        new_sections = set(new_config.sections())
 
         # check that sections in the original file are present in the new file
         for section in orig_config.sections():
-            if not section in new_config.sections():
+            if not section in new_sections:
                 report_mismatch(orig_file, new_file)
                 print(f"Section [{section}] missing in new file.")
                 self.fail("Config mismatch: missing section")
 
             orig_section = orig_config[section]
             new_section = new_config[section]
+            orig_keys = set(orig_section.keys())
+            new_keys = set(new_section.keys())
 
             # check that options in the original file are present in the new file
             for key, orig_value in orig_section.items():
-                if key not in new_section.keys():
+                if key not in new_keys:
                     report_mismatch(orig_file, new_file)
                     print(f"key '{key}' in section [{section}] missing in new "
                           f"file.")
@@ -110,20 +114,17 @@ class ConfigTest(AbstractTest):
                     self.fail("Config mismatch: different key")
 
             # check that options in the new file are present in the original file
-            for key in new_section.keys():
-                if key not in orig_section.keys():
-                    report_mismatch(orig_file, new_file)
-                    print(
-                        f"key '{key}' in section [{section}] missing in original "
-                        f"file.")
-                    self.fail("Config mismatch: missing key")
+            for key in new_keys - orig_keys:
+                report_mismatch(orig_file, new_file)
+                print(f"key '{key}' in section [{section}] missing in original "
+                      f"file.")
+                self.fail("Config mismatch: missing key")
 
         # check that sections in the new file are present in the original file
-        for section in new_config.sections():
-            if not section in orig_config.sections():
-                report_mismatch(orig_file, new_file)
-                print(f"Section [{section}] missing in original file.")
-                self.fail("Config mismatch: missing section")
+        for section in new_sections - orig_sections:
+            report_mismatch(orig_file, new_file)
+            print(f"Section [{section}] missing in original file.")
+            self.fail("Config mismatch: missing section")
 
     def test_config(self):
         """Basic test for config.
@@ -41,30 +41,32 @@ class LoggingTest(AbstractTest):
     def test_logging(self):
         """ Test the loggin utils"""
         out_dir = f"{THIS_DIR}/results/log_tests/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
         test_dir = f"{THIS_DIR}/data/log_tests/"
 
         for level in LOGGING_LEVELS:
-            if isinstance(level, str):
-                out_file = f"{out_dir}log_level_{level.lower()}.txt"
-                test_file = f"{test_dir}log_level_{level.lower()}.txt"
-            else:
-                out_file = f"{out_dir}log_level_{level}.txt"
-                test_file = f"{test_dir}log_level_{level}.txt"
-
-            # make sure logging is reset
-            reset_logger()
-
-            setup_logger(
-                logging_level_console=level,
-                log_file=out_file,
-                logging_level_file=level,
-            )
-
-            print_log_test_messages()
-
-            self.compare_ascii(test_file, out_file)
+            # run each level as a separate subtest so that a failure does not
+            # hide the results of the remaining levels
+            with self.subTest(level=level):
+                if isinstance(level, str):
+                    out_file = f"{out_dir}log_level_{level.lower()}.txt"
+                    test_file = f"{test_dir}log_level_{level.lower()}.txt"
+                else:
+                    out_file = f"{out_dir}log_level_{level}.txt"
+                    test_file = f"{test_dir}log_level_{level}.txt"
+
+                # make sure logging is reset
+                reset_logger()
+
+                setup_logger(
+                    logging_level_console=level,
+                    log_file=out_file,
+                    logging_level_file=level,
+                )
+
+                print_log_test_messages()
+
+                self.compare_ascii(test_file, out_file)
 
 
 def print_log_test_messages():
@@ -1,15 +1,23 @@
 """This file contains stacker tests"""
 import os
+import shutil
 import unittest
+from unittest import mock
 
 from astropy.io import fits
+from astropy.table import Table
 import numpy as np
 
 from stacking.errors import StackerError
 from stacking.spectrum import Spectrum
 from stacking.stackers.merge_stacker_utils import (
+    READ_STACK_CACHE_SIZE,
+    find_existing_files,
     load_splits_info,
     load_stacks,
+    read_stack,
+    read_stack_from_disk,
+    table_hdu_to_pandas,
 )
 from stacking.tests.abstract_test import AbstractTest
 
@@ -25,10 +33,60 @@ class MergeStackerUtilsTest(AbstractTest):
     Methods
     -------
     (see AbstractTest in stacking/tests/abstract_test.py)
+    test_find_existing_files
     test_load_splits_info
     test_load_stacks
+    test_read_stack
+    test_table_hdu_to_pandas
     """
 
+    def test_find_existing_files(self):
+        """Test function find_existing_files"""
+        file_list = [
+            f"{THIS_DIR}/data/standard_writer.fits.gz",
+            f"{THIS_DIR}/data/missing_file.fits.gz",
+            f"{THIS_DIR}/data/split_writer.fits.gz",
+            f"{THIS_DIR}/missing_dir/standard_writer.fits.gz",
+        ]
+        existing_files = find_existing_files(file_list)
+        self.assertEqual(
+            existing_files, {
+                f"{THIS_DIR}/data/standard_writer.fits.gz",
+                f"{THIS_DIR}/data/split_writer.fits.gz",
+            })
+
+        # files without a directory are searched in the current directory
+        cwd = os.getcwd()
+        try:
+            os.chdir(f"{THIS_DIR}/data")
+            existing_files = find_existing_files(
+                ["standard_writer.fits.gz", "missing_file.fits.gz"])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(existing_files, {"standard_writer.fits.gz"})
+
+        # broken symlinks do not count as existing files
+        link_dir = f"{THIS_DIR}/results/find_existing_files"
+        shutil.rmtree(link_dir, ignore_errors=True)
+        os.makedirs(link_dir)
+        os.symlink(f"{THIS_DIR}/data/standard_writer.fits.gz",
+                   f"{link_dir}/good_link.fits.gz")
+        os.symlink(f"{THIS_DIR}/data/missing_file.fits.gz",
+                   f"{link_dir}/broken_link.fits.gz")
+        existing_files = find_existing_files([
+            f"{link_dir}/good_link.fits.gz", f"{link_dir}/broken_link.fits.gz"
+        ])
+        self.assertEqual(existing_files, {f"{link_dir}/good_link.fits.gz"})
+
+        # directories that cannot be listed are checked file by file
+        with mock.patch("os.scandir", side_effect=PermissionError):
+            existing_files = find_existing_files(file_list)
+        self.assertEqual(
+            existing_files, {
+                f"{THIS_DIR}/data/standard_writer.fits.gz",
+                f"{THIS_DIR}/data/split_writer.fits.gz",
+            })
+
     def test_load_splits_info(self):
         """Test function load_splits_info"""
         test_file = f"{THIS_DIR}/data/split_writer.fits.gz"
@@ -124,14 +182,15 @@ class MergeStackerUtilsTest(AbstractTest):
         hdu.close()
 
         # case 1: normal execution
-        stacks = load_stacks(STACK_LIST)
-        self.assertEqual(len(stacks), 2)
-        self.assertEqual(len(stacks[0]), 2)
-        self.assertEqual(len(stacks[1]), 2)
-        self.assertTrue(np.allclose(stacks[0][0], test_flux))
-        self.assertTrue(np.allclose(stacks[1][0], test_flux))
-        self.assertTrue(np.allclose(stacks[0][1], test_weight))
-        self.assertTrue(np.allclose(stacks[1][1], test_weight))
+        stacks_flux, stacks_weight = load_stacks(STACK_LIST)
+        self.assertEqual(stacks_flux.shape, (2, test_flux.size))
+        self.assertEqual(stacks_weight.shape, (2, test_weight.size))
+        self.assertTrue(np.allclose(stacks_flux[0], test_flux))
+        self.assertTrue(np.allclose(stacks_flux[1], test_flux))
+        self.assertTrue(np.allclose(stacks_weight[0], test_weight))
+        self.assertTrue(np.allclose(stacks_weight[1], test_weight))
+        self.assertEqual(stacks_flux.dtype, float)
+        self.assertEqual(stacks_weight.dtype, float)
 
         # case 2: missing common wavelength grid
         # make sure Spectrum.common_wavelength_grid is not set
@@ -139,14 +198,13 @@ class MergeStackerUtilsTest(AbstractTest):
         Spectrum.common_wavelength_grid = None
         # run test
         load_stacks(STACK_LIST)
-        stacks = load_stacks(STACK_LIST)
-        self.assertTrue(len(stacks) == 2)
-        self.assertTrue(len(stacks[0]) == 2)
-        self.assertTrue(len(stacks[1]) == 2)
-        self.assertTrue(np.allclose(stacks[0][0], test_flux))
-        self.assertTrue(np.allclose(stacks[1][0], test_flux))
-        self.assertTrue(np.allclose(stacks[0][1], test_weight))
-        self.assertTrue(np.allclose(stacks[1][1], test_weight))
+        stacks_flux, stacks_weight = load_stacks(STACK_LIST)
+        self.assertEqual(stacks_flux.shape, (2, test_flux.size))
+        self.assertEqual(stacks_weight.shape, (2, test_weight.size))
+        self.assertTrue(np.allclose(stacks_flux[0], test_flux))
+        self.assertTrue(np.allclose(stacks_flux[1], test_flux))
+        self.assertTrue(np.allclose(stacks_weight[0], test_weight))
+        self.assertTrue(np.allclose(stacks_weight[1], test_weight))
 
         # case 3: common wavelength grid of different size
         # reset Spectrum.common_wavelength_grid
@@ -175,6 +233,68 @@ class MergeStackerUtilsTest(AbstractTest):
             load_stacks(STACK_LIST)
         self.compare_error_message(context_manager, expected_message)
 
+        # case 5: empty list of stacks
+        expected_message = (
+            "Error loading stacked spectra. The list of stacks is empty")
+        with self.assertRaises(StackerError) as context_manager:
+            load_stacks([])
+        self.compare_error_message(context_manager, expected_message)
+
+    def test_read_stack(self):
+        """Test function read_stack"""
+        test_file = f"{THIS_DIR}/data/standard_writer.fits.gz"
+        hdu = fits.open(test_file)
+        test_wavelength = hdu["STACK"].data["WAVELENGTH"]  # pylint: disable=no-member
+        test_flux = hdu["STACK"].data["STACKED_FLUX"]  # pylint: disable=no-member
+        test_weight = hdu["STACK"].data["STACKED_WEIGHT"]  # pylint: disable=no-member
+        hdu.close()
+
+        wavelength, flux, weight = read_stack(test_file)
+        self.assertTrue(np.allclose(wavelength, test_wavelength))
+        self.assertTrue(np.allclose(flux, test_flux))
+        self.assertTrue(np.allclose(weight, test_weight))
+
+        # a missing HDU raises an error
+        with self.assertRaises(KeyError):
+            read_stack(test_file, hdu_name="MISSING")
+
+        # a second read is served from the cache
+        self.assertFalse(flux.flags.writeable)
+        _, flux_cached, _ = read_stack(test_file)
+        self.assertTrue(flux_cached is flux)
+
+        # the cache is invalidated when the file changes
+        out_file = f"{THIS_DIR}/results/read_stack.fits.gz"
+        shutil.copyfile(test_file, out_file)
+        _, flux_copy, _ = read_stack(out_file)
+        os.utime(out_file, ns=(0, 0))
+        _, flux_touched, _ = read_stack(out_file)
+        self.assertFalse(flux_touched is flux_copy)
+        self.assertTrue(np.allclose(flux_touched, test_flux))
+
+        # the cache is bounded and can be emptied
+        # (pylint does not understand the lru_cache wrapper)
+        # pylint: disable=no-value-for-parameter
+        cache_info = read_stack_from_disk.cache_info()
+        self.assertLessEqual(cache_info.currsize, READ_STACK_CACHE_SIZE)
+        read_stack_from_disk.cache_clear()
+        cache_info = read_stack_from_disk.cache_info()
+        # pylint: enable=no-value-for-parameter
+        self.assertEqual(cache_info.currsize, 0)
+        _, flux_reread, _ = read_stack(test_file)
+        self.assertFalse(flux_reread is flux)
+
+    def test_table_hdu_to_pandas(self):
+        """Test function table_hdu_to_pandas"""
+        test_file = f"{THIS_DIR}/data/split_writer.fits.gz"
+        for hdu_name in ["GROUPS_INFO", "METADATA_SPECTRA"]:
+            expected_df = Table.read(test_file, hdu=hdu_name).to_pandas()
+            with fits.open(test_file) as hdul:
+                data_frame = table_hdu_to_pandas(hdul[hdu_name])
+
+            self.assertTrue(data_frame.equals(expected_df))
+            self.assertTrue(all(data_frame.dtypes == expected_df.dtypes))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -80,7 +80,10 @@ class NormalizerTest(AbstractTest):
         self.assertTrue(isinstance(normalizer.norm_factors, pd.DataFrame))
 
         # save results
-        normalizer.norm_factors.to_csv(out_file, sep=" ", index=False)
+        normalizer.norm_factors.to_csv(out_file,
+                                       sep=" ",
+                                       index=False,
+                                       na_rep="nan")
 
         # compare against expectations
         self.compare_ascii_numeric(test_file, out_file)
@@ -108,8 +111,7 @@ class NormalizerTest(AbstractTest):
         """Test the class MultipleRegionsNormalization"""
         test_dir = f"{THIS_DIR}/data/multiple_regions_normalization/"
         out_dir = f"{THIS_DIR}/results/multiple_regions_normalization/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
 
         for num_processors in [0, 1, 2]:
             spectra = [copy(spectrum) for spectrum in REBINNED_SPECTRA]
@@ -147,8 +149,9 @@ class NormalizerTest(AbstractTest):
             self.assertTrue(normalizer.save_format == "fits.gz")
             self.compare_fits(f"{test_dir}normalization_factors.fits.gz",
                               f"{out_dir}normalization_factors.fits.gz")
-            self.compare_ascii_numeric(f"{test_dir}normalized_fluxes.txt",
-                                       f"{out_dir}normalized_fluxes.txt")
+            self.compare_ascii_numeric(
+                f"{test_dir}normalized_fluxes_num_processors.txt",
+                f"{out_dir}normalized_fluxes_num_processors.txt")
 
     def test_multiple_regions_normalization_compute_correction_factors(self):
         """Test method compute_correction_factors from MultipleRegionsNormalization"""
@@ -431,8 +434,7 @@ class NormalizerTest(AbstractTest):
     def test_multiple_regions_normalization_save_norm_factors(self):
         """Test method compute_norm_factors from MultipleRegionsNormalization"""
         out_dir = f"{THIS_DIR}/results/multiple_regions_normalization_save_norm_factors/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
         test_dir = f"{THIS_DIR}/data/multiple_regions_normalization_save_norm_factors/"
 
         save_formats = ["txt", "fits.gz"]
@@ -469,8 +471,7 @@ class NormalizerTest(AbstractTest):
     def test_multiple_regions_normalization_save_norm_factors_skip(self):
         """Test method compute_norm_factors from MultipleRegionsNormalization"""
         out_dir = f"{THIS_DIR}/results/multiple_regions_normalization_save_norm_factors_skip/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
 
         normalizer_kwargs = MULTIPLE_REGIONS_NORMALIZATION_KWARGS.copy()
         normalizer_kwargs.update({
@@ -1,5 +1,6 @@
 """This file contains rebin tests"""
 from configparser import ConfigParser
+import copy
 import os
 import unittest
 
@@ -11,6 +12,7 @@ from stacking.rebin import defaults as defaults_rebin
 from stacking.rebin import Rebin, VALID_STEP_TYPES
 from stacking.rebin import find_bins as function_find_bins
 from stacking.rebin import rebin as function_rebin
+from stacking.rebin import rebin_multiple as function_rebin_multiple
 from stacking.tests.utils import SPECTRA
 from stacking.tests.abstract_test import AbstractTest
 
@@ -31,6 +33,7 @@ class RebinTest(AbstractTest):
     test_rebin_lin
     test_rebin_log
     test_rebin_missing_options
+    test_rebin_spectra
     """
 
     def run_rebin_with_errors(self, rebin_kwargs, expected_message):
@@ -136,6 +139,34 @@ class RebinTest(AbstractTest):
         self.assertTrue(np.allclose(rebinned_flux_jit, rebinned_flux_python))
         self.assertTrue(np.allclose(rebinned_ivar_jit, rebinned_ivar_python))
 
+    def test_function_rebin_multiple(self):
+        """Test function rebin_multiple"""
+        wavelength = np.linspace(1000, 5000, 100)
+        flux = np.arange(wavelength.size)
+        ivar = np.arange(wavelength.size) * 0.01
+        common_wavelength_grid = np.linspace(1000, 5000, 10)
+        sizes = np.array([40, 60])
+
+        # test function
+        rebinned_flux_jit, rebinned_ivar_jit = function_rebin_multiple(
+            flux, ivar, wavelength, sizes, common_wavelength_grid)
+        self.assertEqual(rebinned_flux_jit.shape, (2, 10))
+        start = 0
+        for index, size in enumerate(sizes):
+            expected_flux, expected_ivar = function_rebin(
+                flux[start:start + size], ivar[start:start + size],
+                wavelength[start:start + size], common_wavelength_grid)
+            self.assertTrue(np.allclose(rebinned_flux_jit[index],
+                                        expected_flux))
+            self.assertTrue(np.allclose(rebinned_ivar_jit[index],
+                                        expected_ivar))
+            start += size
+
+        rebinned_flux_python, rebinned_ivar_python = function_rebin_multiple.py_func(
+            flux, ivar, wavelength, sizes, common_wavelength_grid)
+        self.assertTrue(np.allclose(rebinned_flux_jit, rebinned_flux_python))
+        self.assertTrue(np.allclose(rebinned_ivar_jit, rebinned_ivar_python))
+
     def test_rebin_invalid_step_type(self):
         """Check the behaviour when the step type is not valid"""
         rebin_kwargs = {
@@ -214,6 +245,37 @@ class RebinTest(AbstractTest):
 
         self.check_missing_options(options_and_values, Rebin, RebinError)
 
+    def test_rebin_spectra(self):
+        """Check that rebinning in batches gives the same results as
+        rebinning the spectra one by one"""
+        for rebin_kwargs in [{
+                "max wavelength": 5000,
+                "min wavelength": 1000,
+                "step type": "lin",
+                "step wavelength": 0.8,
+        }, {
+                "max wavelength": 4999.1941102499995,
+                "min wavelength": 1000,
+                "step type": "log",
+                "step wavelength": 1e-4,
+        }]:
+            config = create_rebin_config(rebin_kwargs)
+            rebin = Rebin(config["rebin"])
+
+            expected_spectra = [
+                rebin(spectrum) for spectrum in copy.deepcopy(SPECTRA)
+            ]
+            spectra = copy.deepcopy(SPECTRA)
+            rebin.rebin_spectra(spectra)
+
+            for spectrum, expected_spectrum in zip(spectra, expected_spectra):
+                self.assertTrue(
+                    np.array_equal(spectrum.flux_common_grid,
+                                   expected_spectrum.flux_common_grid))
+                self.assertTrue(
+                    np.array_equal(spectrum.ivar_common_grid,
+                                   expected_spectrum.ivar_common_grid))
+
 
 def create_rebin_config(rebin_kwargs):
     """Create a configuration instance to run Rebin
@@ -8,11 +8,18 @@ import pandas as pd
 from stacking.stackers.split_stacker_utils import (
     assign_group_multiple_cuts,
     assign_group_one_cut,
+    downcast_column,
     extract_split_cut_sets,
+    find_catalogue_rows,
+    find_group_numbers,
     find_interval_index,
+    find_interval_indexs,
     format_split_on,
     format_splits,
+    group_number_dtype,
     retreive_group_number,
+    retreive_group_numbers,
+    sort_specids,
 )
 from stacking.tests.abstract_test import AbstractTest, highlight_print
 
@@ -34,11 +41,18 @@ class SplitStackerUtilsTest(AbstractTest):
     (see AbstractTest in stacking/tests/abstract_test.py)
     test_assign_group_multiple_cuts
     test_assign_group_one_cut
+    test_downcast_column
     test_extract_split_cut_sets
+    test_find_catalogue_rows
+    test_find_group_numbers
     test_find_interval_index
+    test_find_interval_indexs
     test_format_split_on
     test_format_splits
-    test_retreive_group
+    test_group_number_dtype
+    test_retreive_group_number
+    test_retreive_group_numbers
+    test_sort_specids
     """
 
     def test_assign_group_multiple_cuts(self):
@@ -68,11 +82,10 @@ class SplitStackerUtilsTest(AbstractTest):
         ]
 
         for test in tests:
-            output = ASSIGN_GROUP_DATA.apply(assign_group_multiple_cuts,
-                                             axis=1,
-                                             args=(test.get("variables"),
-                                                   test.get("intervals"),
-                                                   test.get("num_intervals")))
+            output = assign_group_multiple_cuts(ASSIGN_GROUP_DATA,
+                                                test.get("variables"),
+                                                test.get("intervals"),
+                                                test.get("num_intervals"))
 
             self.assertTrue(np.allclose(output, test.get("expectations")))
 
@@ -83,15 +96,30 @@ class SplitStackerUtilsTest(AbstractTest):
                  (15, np.array([-1, -1, 15, 16, 17, 17, 17, 17, -1, -1]))]
 
         for offset, expectations in tests:
-            output = ASSIGN_GROUP_DATA.apply(assign_group_one_cut,
-                                             axis=1,
-                                             args=("var 1",
-                                                   np.array([12, 13, 14, 18],
-                                                            dtype=float),
-                                                   offset))
+            output = assign_group_one_cut(
+                ASSIGN_GROUP_DATA, "var 1",
+                np.array([12, 13, 14, 18], dtype=float), offset)
 
             self.assertTrue(np.allclose(output, expectations))
 
+    def test_downcast_column(self):
+        """Test function downcast_column"""
+        tests = [
+            # lossless downcasts
+            (pd.Series([0.5, 1.25, np.nan]), np.float32),
+            (pd.Series([1, -2, 2**31 - 1], dtype=np.int64), np.int32),
+            # lossy downcasts are not applied
+            (pd.Series([0.1, 1.25]), np.float64),
+            (pd.Series([1, 2**31], dtype=np.int64), np.int64),
+            # other types are not modified
+            (pd.Series([True, False]), bool),
+        ]
+
+        for column, expected_dtype in tests:
+            output = downcast_column(column)
+            self.assertEqual(output.dtype, expected_dtype)
+            self.assertTrue(np.array_equal(output, column, equal_nan=True))
+
     def test_extract_split_cut_sets(self):
         """Test function extract_split_cut_sets"""
         tests = [
@@ -112,6 +140,41 @@ class SplitStackerUtilsTest(AbstractTest):
                       f"{expectation}. Found {splits_cuts_sets}")
                 self.fail("Extract split_cut_sets: incorrect formatting")
 
+    def test_find_catalogue_rows(self):
+        """Test function find_catalogue_rows"""
+        catalogue_specids = np.array([7, 3, 11, 5, 2], dtype=np.int32)
+        specids = np.array([5, 2, 12, 7, 1, 11, 3, 5])
+        expectations = np.array([3, 4, -1, 0, -1, 2, 1, 3])
+
+        output = find_catalogue_rows(specids, catalogue_specids)
+        self.assertTrue(np.array_equal(output, expectations))
+
+        # empty catalogue
+        output = find_catalogue_rows(specids, np.array([], dtype=np.int64))
+        self.assertTrue(np.array_equal(output, np.full(specids.size, -1)))
+
+        # no specids
+        output = find_catalogue_rows(np.array([], dtype=np.int64),
+                                     catalogue_specids)
+        self.assertEqual(output.size, 0)
+
+    def test_find_group_numbers(self):
+        """Test function find_group_numbers"""
+        values = np.array(
+            [ASSIGN_GROUP_DATA["var 1"], ASSIGN_GROUP_DATA["var 2"]],
+            dtype=float)
+        cuts = np.array([[12, 13, 14, 18], [-0.45, 0.0, 0.45, 0.0]])
+        num_cuts = np.array([4, 3])
+        weights = np.array([1, 3])
+        expectations = np.array([-1, -1, 3, 4, 2, -1, 2, 5, -1, -1])
+
+        output = find_group_numbers(values, cuts, num_cuts, weights)
+        self.assertTrue(np.array_equal(output, expectations))
+
+        output_python = find_group_numbers.py_func(values, cuts, num_cuts,
+                                                   weights)
+        self.assertTrue(np.array_equal(output_python, expectations))
+
     def test_find_interval_index(self):
         """Test function find_interval_index"""
         intervals = np.arange(5, dtype=float) + 10
@@ -123,6 +186,9 @@ class SplitStackerUtilsTest(AbstractTest):
             (300, -1),
             (10.5, 0),
             (11.0, 1),
+            (13.9, 3),
+            (14.0, -1),
+            (np.nan, -1),
         ]
 
         for value, expectation in tests:
@@ -137,6 +203,27 @@ class SplitStackerUtilsTest(AbstractTest):
             output_python = find_interval_index.py_func(value, intervals)
             self.assertTrue(np.allclose(output, output_python))
 
+    def test_find_interval_indexs(self):
+        """Test function find_interval_indexs"""
+        intervals = np.arange(5, dtype=float) + 10
+        values = np.array([
+            5.0, 5, 300, 10.0, 10.5, 11.0, 14.0, 13.9, np.nan, -np.inf, np.inf
+        ])
+        expectations = np.array([-1, -1, -1, 0, 0, 1, -1, 3, -1, -1, -1])
+
+        output = find_interval_indexs(values, intervals)
+        self.assertTrue(np.array_equal(output, expectations))
+
+        # check consistency with the scalar version
+        for value, output_value in zip(values, output):
+            self.assertEqual(find_interval_index(value, intervals),
+                             output_value)
+
+        # check consistency with pandas binning
+        codes = pd.cut(values, bins=intervals, right=False, labels=False)
+        self.assertTrue(
+            np.array_equal(output, np.where(np.isnan(codes), -1, codes)))
+
     def test_format_split_on(self):
         """Test function format_split_on"""
         # test different cases
@@ -181,6 +268,7 @@ class SplitStackerUtilsTest(AbstractTest):
             (["1.1,2.2,3.3,4.4"], [np.array([1.1, 2.2, 3.3, 4.4])]),
             (["1.1, 2.2, 3.3, 4.4"], [np.array([1.1, 2.2, 3.3, 4.4])]),
             (["[1.1, 2.2, 3.3, 4.4]"], [np.array([1.1, 2.2, 3.3, 4.4])]),
+            (["[ 1.1, 2.2, 3.3, 4.4 ]"], [np.array([1.1, 2.2, 3.3, 4.4])]),
             # two sets
             (["1.1, 2.2",
               "3.3, 4.4"], [np.array([1.1, 2.2]),
@@ -226,19 +314,79 @@ class SplitStackerUtilsTest(AbstractTest):
                         f"{expectation}")
                     self.fail("Format splits: incorrect cuts")
 
+    def test_group_number_dtype(self):
+        """Test function group_number_dtype"""
+        tests = [
+            (2, np.int8),
+            (127, np.int8),
+            (128, np.int8),
+            (129, np.int16),
+            (300, np.int16),
+            (40000, np.int32),
+        ]
+
+        for num_groups, expectation in tests:
+            self.assertEqual(group_number_dtype(num_groups), expectation)
+
     def test_retreive_group_number(self):
         """Test function retreive_group_number"""
-        specid = 12345678
         specids = np.array(
             [31345346264346, 12345678, 4522457457457, 4574573543457], dtype=int)
         groups = np.array([-1, 0, 5, 1])
-        expected_value = 0
+        specids, groups = sort_specids(specids, groups)
 
-        output = retreive_group_number(specid, specids, groups)
-        self.assertTrue(output == expected_value)
+        # test different cases
+        tests = [
+            (12345678, 0),
+            (31345346264346, -1),
+            (4522457457457, 5),
+            (4574573543457, 1),
+            # specids not in the catalogue
+            (1, -1),
+            (4522457457458, -1),
+            (31345346264347, -1),
+        ]
 
-        output = retreive_group_number.py_func(specid, specids, groups)
-        self.assertTrue(output == expected_value)
+        for specid, expected_value in tests:
+            output = retreive_group_number(specid, specids, groups)
+            self.assertTrue(output == expected_value)
+
+            output = retreive_group_number.py_func(specid, specids, groups)
+            self.assertTrue(output == expected_value)
+
+    def test_retreive_group_numbers(self):
+        """Test function retreive_group_numbers"""
+        specids = np.array(
+            [31345346264346, 12345678, 4522457457457, 4574573543457], dtype=int)
+        groups = np.array([-1, 0, 5, 1])
+        specids, groups = sort_specids(specids, groups)
+
+        values = np.array([
+            12345678, 31345346264346, 4522457457457, 4574573543457, 1,
+            4522457457458, 31345346264347
+        ])
+        expectations = np.array([0, -1, 5, 1, -1, -1, -1])
+
+        output = retreive_group_numbers(values, specids, groups)
+        self.assertTrue(np.array_equal(output, expectations))
+
+        # check consistency with the scalar version
+        for value, output_value in zip(values, output):
+            self.assertEqual(retreive_group_number(value, specids, groups),
+                             output_value)
+
+        # empty catalogue
+        output = retreive_group_numbers(values, specids[:0], groups[:0])
+        self.assertTrue(np.array_equal(output, np.full(values.size, -1)))
+
+    def test_sort_specids(self):
+        """Test function sort_specids"""
+        specids = np.array([7, 3, 11, 5])
+        groups = np.array([0, 1, 2, -1])
+
+        sorted_specids, sorted_groups = sort_specids(specids, groups)
+        self.assertTrue(np.array_equal(sorted_specids, [3, 5, 7, 11]))
+        self.assertTrue(np.array_equal(sorted_groups, [1, -1, 0, 2]))
 
 
 if __name__ == '__main__':
@@ -9,6 +9,8 @@ import pandas as pd
 
 from stacking.errors import StackerError
 from stacking.spectrum import Spectrum
+from stacking.stackers.bootstrap_split_mean_stacker import (
+    BootstrapSplitMeanStacker)
 from stacking.stackers.mean_stacker import MeanStacker
 from stacking.stackers.median_stacker import MedianStacker
 from stacking.stackers.merge_mean_stacker import MergeMeanStacker
@@ -42,6 +44,7 @@ MERGE_STACKER_OPTIONS_AND_VALUES = [
 ]
 
 SPLIT_STACKER_KWARGS = {
+    "num processors": 1,
     "specid name": "THING_ID",
     "split catalogue name": f"{THIS_DIR}/data/drq_catalogue_plate3655.fits.gz",
     "split on": "Z",
@@ -57,6 +60,7 @@ SPLIT_STACKER_OPTIONS_AND_VALUES = [
     ("split on", "Z"),
     ("split type", "OR"),
     ("split cuts", "[1.1 1.2 1.3]"),
+    ("num processors", "1"),
 ]
 
 
@@ -67,6 +71,7 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
     -------
     (see AbstractTest in stacking/tests/abstract_test.py)
     run_simple_stack
+    test_bootstrap_split_mean_stacker
     test_mean_stacker
     test_mean_stacker_invalid_sigma_i
     test_mean_stacker_missing_options
@@ -89,6 +94,7 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
     test_split_median_stacker_missing_options
     test_split_stacker_assign_groups
     test_split_stacker_inconsistent_split_cuts_and_split_on
+    test_split_stacker_invalid_split_cuts
     test_split_stacker_invalid_split_type
     test_split_stacker_missing_options
     test_split_stacker_read_catalogue
@@ -149,6 +155,52 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         self.assertTrue(stacker.split_catalogue.columns[3] == "GROUP_0")
         self.assertTrue(stacker.split_catalogue.shape[0] == 79)
 
+    def test_bootstrap_split_mean_stacker(self):
+        """Check BootstrapSplitMeanStacker"""
+        split_stacker_kwargs = SPLIT_STACKER_KWARGS.copy()
+        split_stacker_kwargs.update({
+            "split cuts": "[1.0 1.5 2.0]",
+            "sigma_I": 0.05,
+            "num bootstrap": 3,
+            "random seed": 458369,
+        })
+        config = create_split_stacker_config(split_stacker_kwargs)
+        stacker = BootstrapSplitMeanStacker(config["stacker"])
+
+        self.assertTrue(isinstance(stacker.main_stacker, SplitMeanStacker))
+        self.assertEqual(len(stacker.bootstrap_stackers), 3)
+        # the catalogue information is shared by all the realizations
+        for item in stacker.bootstrap_stackers:
+            self.assertTrue(isinstance(item, SplitMeanStacker))
+            self.assertTrue(
+                item.split_catalogue is stacker.main_stacker.split_catalogue)
+            self.assertTrue(
+                item.groups_info is stacker.main_stacker.groups_info)
+            self.assertTrue(
+                item.group_matrix is stacker.main_stacker.group_matrix)
+            # realizations are always stacked serially
+            self.assertEqual(item.num_processors, 1)
+
+        # stack the spectra; the errors have one column per group
+        stacker.stack(NORMALIZED_SPECTRA)
+        self.assertEqual(stacker.main_stacker.stacked_error.shape,
+                         (COMMON_WAVELENGTH_GRID.size, 2))
+
+        # stacking the groups of the main stack in parallel gives the same
+        # results
+        split_stacker_kwargs["num processors"] = 2
+        config = create_split_stacker_config(split_stacker_kwargs)
+        parallel_stacker = BootstrapSplitMeanStacker(config["stacker"])
+        self.assertEqual(parallel_stacker.main_stacker.num_processors, 2)
+        parallel_stacker.stack(NORMALIZED_SPECTRA)
+        self.assertTrue(
+            np.allclose(parallel_stacker.main_stacker.stacked_flux,
+                        stacker.main_stacker.stacked_flux))
+        self.assertTrue(
+            np.allclose(parallel_stacker.main_stacker.stacked_error,
+                        stacker.main_stacker.stacked_error,
+                        equal_nan=True))
+
     def test_mean_stacker(self):
         """Test the class MeanStacker"""
         out_file = f"{THIS_DIR}/results/mean_stacking.txt"
@@ -214,6 +266,15 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         """Check the class MergeStacker"""
         config = create_merge_stacker_config(MERGE_STACKER_KWARGS)
         stacker = MergeStacker(config["stacker"])
+
+        # the stacks are stored as arrays, but are still accessible as a list
+        self.assertEqual(stacker.stacks_flux.shape[0], 2)
+        self.assertEqual(stacker.stacks_weight.shape, stacker.stacks_flux.shape)
+        self.assertEqual(len(stacker.stacks), 2)
+        for index, (flux, weight) in enumerate(stacker.stacks):
+            self.assertTrue(np.allclose(flux, stacker.stacks_flux[index]))
+            self.assertTrue(np.allclose(weight, stacker.stacks_weight[index]))
+
         expected_message = "Method 'stack' was not overloaded by child class"
         with self.assertRaises(StackerError) as context_manager:
             stacker.stack(NORMALIZED_SPECTRA)
@@ -250,6 +311,15 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
             MergeStacker(config["stacker"])
         self.compare_error_message(context_manager, expected_message)
 
+        # case 3: empty list of files
+        config = ConfigParser()
+        config.read_dict({"stacker": {"hdu name": "STACK", "stack list": ""}})
+        expected_message = (
+            "Error loading stacked spectra. The list of stacks is empty")
+        with self.assertRaises(StackerError) as context_manager:
+            MergeStacker(config["stacker"])
+        self.compare_error_message(context_manager, expected_message)
+
     def test_merge_stacker_missing_options(self):
         """Check that errors are raised when required options are missing"""
         self.check_missing_options(MERGE_STACKER_OPTIONS_AND_VALUES,
@@ -430,6 +500,9 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         self.assertTrue(len(stacker.stackers) == stacker.num_groups)
         for item in stacker.stackers:
             self.assertTrue(isinstance(item, MeanStacker))
+        # each group must have its own stacker instance
+        self.assertEqual(len({id(item) for item in stacker.stackers}),
+                         stacker.num_groups)
 
     def test_split_mean_stacker_missing_options(self):
         """Check that errors are raised when required options are missing"""
@@ -454,6 +527,9 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         self.assertTrue(len(stacker.stackers) == stacker.num_groups)
         for item in stacker.stackers:
             self.assertTrue(isinstance(item, MedianStacker))
+        # each group must have its own stacker instance
+        self.assertEqual(len({id(item) for item in stacker.stackers}),
+                         stacker.num_groups)
 
     def test_split_median_stacker_missing_options(self):
         """Check that errors are raised when required options are missing"""
@@ -495,6 +571,15 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         self.assertTrue(stacker.split_catalogue.columns[5] == "GROUP_1")
         self.assertTrue(stacker.split_catalogue.shape[0] == 79)
 
+        # check the group membership matrix
+        self.assertEqual(stacker.group_matrix.shape, (79, stacker.num_groups))
+        self.assertTrue(stacker.group_matrix.flags.f_contiguous)
+        for group_number, col in zip(stacker.groups_info["GROUP_NUM"],
+                                     stacker.groups_info["COLNAME"]):
+            self.assertTrue(
+                np.array_equal(stacker.group_matrix[:, group_number],
+                               stacker.split_catalogue[col] == group_number))
+
         # save output and check against expectations
         stacker.split_catalogue.to_csv(out_file, sep=" ", index=False)
         self.compare_ascii_numeric(test_file, out_file)
@@ -528,6 +613,14 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         self.assertTrue(stacker.split_catalogue.columns[4] == "GROUP")
         self.assertTrue(stacker.split_catalogue.shape[0] == 79)
 
+        # check the group membership matrix
+        self.assertEqual(stacker.group_matrix.shape, (79, stacker.num_groups))
+        for group_number in range(stacker.num_groups):
+            self.assertTrue(
+                np.array_equal(
+                    stacker.group_matrix[:, group_number],
+                    stacker.split_catalogue["GROUP"] == group_number))
+
         # save output and check against expectations
         stacker.split_catalogue.to_csv(out_file, sep=" ", index=False)
         self.compare_ascii_numeric(test_file, out_file)
@@ -572,6 +665,22 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
             SplitStacker(config["stacker"])
         self.compare_error_message(context_manager, expected_message)
 
+    def test_split_stacker_invalid_split_cuts(self):
+        """Check the behaviour when the split cuts are not increasing"""
+        for split_cuts, cuts in [("[1.0 3.0 2.0]", "[1.0, 3.0, 2.0]"),
+                                 ("[1.0 1.0 2.0]", "[1.0, 1.0, 2.0]")]:
+            split_stacker_kwargs = SPLIT_STACKER_KWARGS.copy()
+            split_stacker_kwargs.update({"split cuts": split_cuts})
+            config = create_split_stacker_config(split_stacker_kwargs)
+
+            expected_message = (
+                "Invalid value for argument 'split cuts' required by "
+                "SplitStacker. Cuts must be strictly increasing. Found "
+                f"cuts {cuts} for variable 'Z'")
+            with self.assertRaises(StackerError) as context_manager:
+                SplitStacker(config["stacker"])
+            self.compare_error_message(context_manager, expected_message)
+
     def test_split_stacker_invalid_split_type(self):
         """Check the behaviour when the split type is not valid"""
         split_stacker_kwargs = SPLIT_STACKER_KWARGS.copy()
@@ -614,12 +723,10 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
         # calling read_catalogue should raise an error
         stacker_kwargs = SPLIT_STACKER_KWARGS.copy()
         stacker_kwargs["catalogue HDU name or number"] = "99"
-        print(stacker_kwargs)
         expected_message = "SplitStacker: Problem reading HDU 99"
-        # uncomment this when astropy raises errors instead of warnings
-        #with self.assertRaises(StackerError) as context_manager:
-        #    self.run_split_stacker_read_catalogue(stacker_kwargs)
-        #self.compare_error_message(context_manager, expected_message)
+        with self.assertRaises(StackerError) as context_manager:
+            self.run_split_stacker_read_catalogue(stacker_kwargs)
+        self.compare_error_message(context_manager, expected_message)
 
     def test_split_stacker_stack(self):
         """Check method stack from SplitStacker"""
@@ -661,9 +768,9 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
                 "# wavelength stacked_flux1 total_weight1 stacked_flux2 total_weight2\n"
             )
             for wavelength, stacked_flux1, stacked_weight1, stacked_flux2, stacked_weight2 in zip(
-                    COMMON_WAVELENGTH_GRID, stacker.stacked_flux[0],
-                    stacker.stacked_weight[0], stacker.stacked_flux[1],
-                    stacker.stacked_weight[1]):
+                    COMMON_WAVELENGTH_GRID, stacker.stacked_flux[:, 0],
+                    stacker.stacked_weight[:, 0], stacker.stacked_flux[:, 1],
+                    stacker.stacked_weight[:, 1]):
                 results.write(f"{wavelength} {stacked_flux1} {stacked_weight1} "
                               f"{stacked_flux2} {stacked_weight2}\n")
 
@@ -698,15 +805,30 @@ class StackerTest(AbstractTest):  # pylint: disable=too-many-public-methods
                 "# wavelength stacked_flux1 total_weight1 stacked_flux2 total_weight2\n"
             )
             for wavelength, stacked_flux1, stacked_weight1, stacked_flux2, stacked_weight2 in zip(
-                    COMMON_WAVELENGTH_GRID, stacker.stacked_flux[0],
-                    stacker.stacked_weight[0], stacker.stacked_flux[1],
-                    stacker.stacked_weight[1]):
+                    COMMON_WAVELENGTH_GRID, stacker.stacked_flux[:, 0],
+                    stacker.stacked_weight[:, 0], stacker.stacked_flux[:, 1],
+                    stacker.stacked_weight[:, 1]):
                 results.write(f"{wavelength} {stacked_flux1} {stacked_weight1} "
                               f"{stacked_flux2} {stacked_weight2}\n")
 
         # compare with test
         self.compare_ascii_numeric(test_file, out_file)
 
+        # case 3: stacking the groups in parallel gives the same results
+        split_stacker_kwargs["num processors"] = 2
+        config = create_split_stacker_config(split_stacker_kwargs)
+        parallel_stacker = SplitMeanStacker(config["stacker"])
+        parallel_stacker.stack(NORMALIZED_SPECTRA)
+        self.assertTrue(
+            np.allclose(parallel_stacker.stacked_flux, stacker.stacked_flux))
+        self.assertTrue(
+            np.allclose(parallel_stacker.stacked_weight,
+                        stacker.stacked_weight))
+        for group_number, group_stacker in enumerate(parallel_stacker.stackers):
+            self.assertTrue(
+                np.allclose(group_stacker.stacked_flux,
+                            stacker.stacked_flux[:, group_number]))
+
     def test_stacker(self):
         """Test the abstract stacker"""
         config = ConfigParser()
@@ -37,8 +37,7 @@ class WriterTest(AbstractTest):
     def test_standard_writer(self):
         """Test the class StandardWriter"""
         out_dir = f"{THIS_DIR}/results/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
         out_file = "standard_writer.fits.gz"
         test_file = f"{THIS_DIR}/data/standard_writer.fits.gz"
 
@@ -56,8 +55,7 @@ class WriterTest(AbstractTest):
     def test_split_writer(self):
         """Test the class SplitWriter"""
         out_dir = f"{THIS_DIR}/results/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
 
         # case 1: split type = 'or'
         out_file = "split_writer_or.fits.gz"
@@ -89,8 +87,7 @@ class WriterTest(AbstractTest):
         """Test the class SplitWriter when a some fields do not have
         column description"""
         out_dir = f"{THIS_DIR}/results/"
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
         out_file = "split_writer_no_column_desc.fits.gz"
         test_file = f"{THIS_DIR}/data/split_writer_no_column_desc.fits.gz"
 
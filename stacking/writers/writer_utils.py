@@ -140,7 +140,7 @@ def get_metadata_hdu(stacker):
                             format="E",
                             disp="F7.3",
                             array=stacker.split_catalogue[col].values))
-        elif dtype in ["int32", "int64"]:
+        elif dtype in ["int8", "int16", "int32", "int64"]:
             cols_metadata.append(
                 fits.Column(name=col,
                             format="J",